@@ -99,21 +99,151 @@
 #     }
 # agents.py
 import os
-from crewai import Agent, LLM
+import threading
+import contextvars
+from contextlib import contextmanager
+import litellm
+from crewai import Agent, BaseLLM, LLM
+from crewai.events import crewai_event_bus
+from crewai.events.types.llm_events import LLMCallCompletedEvent, LLMCallType
+from crewai.hooks import register_before_llm_call_hook
+from crewai.llms.base_llm import llm_call_context
 from dotenv import load_dotenv
+import llm_client
+import llm_router
+import tasks
+from model_policy import DEFAULT_MODEL, DEFAULT_MAX_TOKENS, DEFAULT_TEMPERATURE
 
 load_dotenv()
 
-llm = LLM(
-    model="openrouter/deepseek/deepseek-r1",
-    api_key=os.getenv("OPENROUTER_API_KEY"),
-    base_url="https://openrouter.ai/api/v1",
-    temperature=0.3,
-    max_tokens=2048   # <<< VERY IMPORTANT
-)
+# CrewAI calls go through litellm; share our keep-alive pool with it
+litellm.client_session = llm_client.get_sync_client()
+litellm.aclient_session = llm_client.get_async_client()
+
+# Mark the shared case prefix (see add_case_prefix) as a prompt-cache
+# breakpoint: an OpenAI-style text block with Anthropic cache_control,
+# which OpenRouter and litellm pass on to providers that cache
+# explicitly (Anthropic, Gemini). DeepSeek and OpenAI cache an identical
+# prefix on their own.
+PROMPT_CACHE = os.getenv("MDAGENTS_PROMPT_CACHE", "1") == "1"
+
+
+def case_message(prefix: str) -> dict:
+    if not PROMPT_CACHE:
+        return {"role": "system", "content": prefix}
+    block = {"type": "text", "text": prefix, "cache_control": {"type": "ephemeral"}}
+    return {"role": "system", "content": [block]}
+
+
+def add_case_prefix(context):
+    """
+    CrewAI before_llm_call hook: put the bound case (tasks.bound_case)
+    ahead of the agent's own system prompt, so every stage of a case
+    sends the same leading message.
+    """
+    prefix = tasks.current_case()
+    if prefix is None:
+        return None
+    message = case_message(prefix)
+    messages = context.messages
+    if messages and messages[0] == message:
+        return None  # a later iteration of the same task
+    messages.insert(0, message)
+    return None
+
+
+register_before_llm_call_hook(add_case_prefix)
+
+# Usage of the calls made for one metrics stage. The crew's own
+# token_usage is the lifetime total of its LLM instances, which llm_for
+# shares between agents and runs, so it cannot be split per stage.
+_usage_record = contextvars.ContextVar("mdagents_usage_record", default=None)
+_usage_lock = threading.Lock()
+
+
+@contextmanager
+def recording_usage(record):
+    """Add the usage of LLM calls made in this context to metrics.StageRecord `record`."""
+    token = _usage_record.set(record)
+    try:
+        yield record
+    finally:
+        _usage_record.reset(token)
+
+
+@crewai_event_bus.on(LLMCallCompletedEvent)
+def add_call_usage(source, event):
+    # Runs on the event bus pool in a copy of the caller's context;
+    # Crew.kickoff flushes the bus before it returns
+    record = _usage_record.get()
+    if record is not None and event.usage:
+        with _usage_lock:
+            record.add_usage(event.usage)
+
+
+class RouterLLM(BaseLLM):
+    """CrewAI LLM that sends completions through llm_router (LLM_ROUTER=1)."""
+
+    def call(self, messages, tools=None, callbacks=None, available_functions=None,
+             from_task=None, from_agent=None, **kwargs):
+        # Same call events as CrewAI's own providers (see add_call_usage)
+        with llm_call_context():
+            self._emit_call_started_event(messages, from_task=from_task, from_agent=from_agent)
+            try:
+                res = llm_router.completion(
+                    self._format_messages(messages), self.model,
+                    max_tokens=self.max_tokens,
+                    temperature=self.temperature,
+                    stop=self.stop or None,
+                )
+            except Exception as e:
+                self._emit_call_failed_event(str(e), from_task, from_agent)
+                raise
+            usage = res.get("usage") or {}
+            self._track_token_usage_internal(usage)
+            content = res["choices"][0]["message"]["content"]
+            self._emit_call_completed_event(
+                content, LLMCallType.LLM_CALL, from_task, from_agent, messages, usage
+            )
+            return content
+
+
+def build_llm(model: str, max_tokens: int, temperature: float):
+    if llm_router.routes(model):
+        return RouterLLM(model=model, max_tokens=max_tokens, temperature=temperature)
+    return LLM(
+        model=model,
+        api_key=os.getenv("OPENROUTER_API_KEY"),
+        base_url=os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1"),
+        max_tokens=max_tokens,
+        temperature=temperature,
+    )
+
+
+_llms = {}
+_llms_lock = threading.Lock()
+
+
+def llm_for(overrides: dict):
+    """
+    The shared LLM with `overrides` (model / max_tokens / temperature, see
+    model_policy.py) applied. One instance per distinct setting is kept;
+    models with a router group get a RouterLLM when LLM_ROUTER=1.
+    """
+    key = (
+        overrides.get("model", DEFAULT_MODEL),
+        overrides.get("max_tokens", DEFAULT_MAX_TOKENS),
+        overrides.get("temperature", DEFAULT_TEMPERATURE),
+    )
+    with _llms_lock:
+        if key not in _llms:
+            _llms[key] = build_llm(*key)
+        return _llms[key]
 
 
 def create_agents():
+    # Built on first use (not at import), then shared through llm_for
+    llm = llm_for({})
 
     moderator = Agent(
         role="Moderator",
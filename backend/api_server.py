@@ -1,16 +1,37 @@
 # api_server.py
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
-from litellm.exceptions import APIError
+import os
+import zlib
+import asyncio
+import json
 import uuid
+import itertools
 import traceback
+from datetime import datetime
+from email.utils import format_datetime, parsedate_to_datetime
 import chatbot
-from crew_runner import run_mdagents
+import executor
+import jobs
+import llm_client
+import llm_router
+import metrics
+import result_cache
+import scheduler
+import storage
+from router import is_medical
+import crew_runner
+from crew_runner import run_mdagents, run_batch, get_pipeline, parallel_calls
 
 app = FastAPI(title="Chatbot API with History")
 
+BATCH_MAX_CASES = int(os.getenv("MDAGENTS_BATCH_MAX_CASES", "10000"))
+# History bodies are sent in ~HISTORY_CHUNK_BYTES pieces and gzipped past HISTORY_GZIP_MIN_BYTES
+HISTORY_CHUNK_BYTES = int(os.getenv("HISTORY_CHUNK_BYTES", "65536"))
+HISTORY_GZIP_MIN_BYTES = int(os.getenv("HISTORY_GZIP_MIN_BYTES", "4096"))
+
 # CORS
 app.add_middleware(
     CORSMiddleware,
@@ -19,22 +40,88 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.exception_handler(executor.QueueFull)
+async def queue_full_handler(request, exc: executor.QueueFull):
+    return JSONResponse(
+        status_code=429,
+        content={"error": "Server is busy, please retry shortly."},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+@app.on_event("startup")
+async def start_background():
+    # The MDAgents stack (crewai, litellm) loads on the first medical query,
+    # or right after startup with MDAGENTS_PREWARM=1 without holding it up
+    if crew_runner.PREWARM:
+        asyncio.get_running_loop().call_soon(crew_runner.prewarm)
+    # Building the LLM router imports litellm: do it before serving, off the loop
+    if llm_router.ROUTER_ENABLED:
+        await asyncio.to_thread(llm_router.get_router)
+    if jobs.workers is not None:
+        # Worker processes run cases outside the scheduler: set their weight aside
+        scheduler.scheduler.reserve(jobs.workers.count * parallel_calls(None))
+        jobs.workers.start()
+
+@app.on_event("shutdown")
+async def shutdown_workers():
+    executor.pool.shutdown(wait=False)
+    if jobs.workers is not None:
+        await asyncio.to_thread(jobs.workers.stop)
+    await llm_client.aclose()
+    storage.store.close()
+
 # --------------------------
 # Helpers
 # --------------------------
-def get_db_conn():
+def not_modified(request: Request, etag: str, last_modified: str | None) -> bool:
+    """Conditional GET: If-None-Match (weak comparison) wins over If-Modified-Since."""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return "*" in tags or etag.removeprefix("W/") in tags
+    since = request.headers.get("if-modified-since")
+    if since and last_modified:
+        try:
+            return parsedate_to_datetime(since) >= parsedate_to_datetime(last_modified)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+def accepts_gzip(request: Request) -> bool:
+    for coding in request.headers.get("accept-encoding", "").split(","):
+        name, _, params = coding.strip().partition(";")
+        if name.strip().lower() == "gzip":
+            return params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000")
+    return False
+
+def gzip_stream(parts):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31: gzip container
+    for part in parts:
+        data = compressor.compress(part)
+        if data:
+            yield data
+    yield compressor.flush()
+
+def json_stream_response(parts, request: Request, headers: dict):
     """
-    Automatically find the correct DB variable used inside chatbot.py.
-    Supports db, _db_conn, conn.
+    Send byte chunks as application/json. Bodies under
+    HISTORY_GZIP_MIN_BYTES go out as one plain response; larger ones
+    stream, gzip-compressed when the client accepts it.
     """
-    for name in ["_db_conn", "db", "conn"]:
-        if hasattr(chatbot, name):
-            return getattr(chatbot, name)
+    head, size = [], 0
+    for part in parts:
+        head.append(part)
+        size += len(part)
+        if size >= HISTORY_GZIP_MIN_BYTES:
+            break
+    else:
+        return Response(b"".join(head), media_type="application/json", headers=headers)
 
-    raise RuntimeError(
-        "No database connection found in chatbot.py. "
-        "Expected one of: _db_conn, db, conn"
-    )
+    body = itertools.chain(head, parts)
+    if accepts_gzip(request):
+        headers = {**headers, "Content-Encoding": "gzip"}
+        body = gzip_stream(body)
+    return StreamingResponse(body, media_type="application/json", headers=headers)
 
 # --------------------------
 # Models
@@ -42,21 +129,15 @@ def get_db_conn():
 class ChatRequest(BaseModel):
     chat_id: str
     message: str
+    no_cache: bool = False  # bypass the MDAgents result cache
 
 class ChatResponse(BaseModel):
     reply: str
     is_medical: bool
 
-# --------------------------
-# Medical Keyword Detection
-# --------------------------
-def is_medical(msg: str):
-    keywords = [
-        "pain", "fever", "infection", "diagnose", "treatment", "sepsis",
-        "scan", "mri", "ct", "injury", "cancer", "stroke"
-    ]
-    msg = msg.lower()
-    return any(k in msg for k in keywords)
+class CaseRequest(BaseModel):
+    query: str
+    no_cache: bool = False
 
 # --------------------------
 # Create New Chat
@@ -70,27 +151,23 @@ def create_new_chat():
 # List All Chats (Sidebar)
 # --------------------------
 @app.get("/api/list_chats")
-def list_chats():
+def list_chats(limit: int = Query(100, ge=1, le=500), cursor: str | None = None):
     try:
-        conn = get_db_conn()
-        cur = conn.cursor()
+        rows, next_cursor = storage.store.list_chats(limit, cursor)
+        chats = [
+            {
+                "id": chat_id,
+                "title": title or "New Chat",
+                "created_at": created_at,
+                "updated_at": updated_at,
+                "message_count": message_count,
+            }
+            for chat_id, title, created_at, updated_at, message_count in rows
+        ]
+        return {"chats": chats, "next_cursor": next_cursor}
 
-        cur.execute("SELECT DISTINCT chat_id FROM messages ORDER BY id DESC")
-        rows = cur.fetchall()
-
-        chats = []
-        for (chat_id,) in rows:
-            cur.execute("""
-                SELECT message FROM messages 
-                WHERE chat_id = ? AND role = 'user'
-                ORDER BY id ASC LIMIT 1
-            """, (chat_id,))
-            row = cur.fetchone()
-            title = row[0][:50] if row else "New Chat"
-
-            chats.append({"id": chat_id, "title": title})
-
-        return {"chats": chats}
+    except (ValueError, TypeError):
+        raise HTTPException(400, "Invalid cursor.")
 
     except Exception as e:
         traceback.print_exc()
@@ -99,66 +176,422 @@ def list_chats():
             content={"error": str(e)}
         )
 
+# --------------------------
+# Medical pipeline → reply text (runs on a worker thread)
+# --------------------------
+def medical_reply(msg: str, on_event=None, use_cache: bool = True,
+                  chat_id: str | None = None, on_join=None, joined=None) -> str:
+    """Format the pipeline's answer; `joined`, a finished run_mdagents Future, skips the run."""
+    from litellm.exceptions import APIError  # loaded with the pipeline anyway
+
+    try:
+        if joined is not None:
+            result = joined.result()
+        else:
+            result = run_mdagents(msg, on_event=on_event, use_cache=use_cache, on_join=on_join)
+        if metrics.TRACE_ROWS and chat_id:
+            storage.store.save_trace(chat_id, result["trace"])
+
+        reasoning = "\n".join(f"- {r}" for r in result.get("reasoning", []))
+        final = result.get("final", "No final output provided.")
+        complexity = result.get("complexity", "Unknown")
+
+        return (
+            f"Medical Reasoning (Educational Only)\n\n"
+            f"Complexity: {complexity}\n\n"
+            f"Reasoning:\n{reasoning}\n\n"
+            f"Final Opinion:\n{final}\n\n"
+            "⚠ Not a substitute for real medical advice."
+        )
+
+    except APIError:
+        # OpenRouter / token / credit issue
+        return (
+            "⚠ Medical AI service is temporarily unavailable due to usage limits.\n\n"
+            "Please try again later."
+        )
+
+    except Exception:
+        # Any unexpected error
+        traceback.print_exc()
+        return "⚠ An internal error occurred while processing the medical query."
+
+BUSY_REPLY = "⚠ The server is busy, please retry shortly."
+
+
+def client_key(request: Request, chat_id: str) -> str:
+    """Fair-queuing key: X-Client-Id when the frontend or a proxy sets one, else the chat."""
+    return request.headers.get("x-client-id") or chat_id
+
+
+def medical_class(msg: str) -> tuple[str, int]:
+    """
+    Scheduler class and weight of a case from its predicted tier (local
+    triage, no LLM call). A case triage is unsure about waits as MODERATE
+    but is weighted as HIGH. The first call loads the pipeline: keep it off
+    the event loop.
+    """
+    stage = get_pipeline().triage
+    tier = stage.decide(msg) if stage else None
+    return tier or "MODERATE", parallel_calls(tier)
+
+
+async def enqueue_medical(msg: str, client: str) -> scheduler.Ticket:
+    """Queue a case on its medical_class, to run on an executor.pool worker."""
+    klass, weight = await asyncio.to_thread(medical_class, msg)
+    return scheduler.scheduler.enqueue(klass, client, weight, worker=True)
+
+
+async def run_medical(admitted, msg: str, on_event=None,
+                      use_cache: bool = True, chat_id: str | None = None) -> str:
+    """
+    Wait for the ticket, then run medical_reply on a worker, holding the
+    ticket until it ends; a run that joins an identical one in flight
+    gives back its weight at once. QueueFull propagates (429).
+    `admitted` may instead be a joined run's Future (see admit_medical).
+    """
+    if not isinstance(admitted, scheduler.Ticket):
+        # asyncio.wait never cancels what it waits on: the Future is shared
+        waiter = asyncio.wrap_future(admitted)
+        waiter.add_done_callback(lambda f: f.cancelled() or f.exception())  # read below
+        await asyncio.wait({waiter})
+        return await asyncio.to_thread(medical_reply, msg, chat_id=chat_id, joined=admitted)
+
+    ticket = admitted
+    await ticket.wait()
+    try:
+        job = executor.pool.submit(
+            medical_reply, msg, on_event, use_cache, chat_id, ticket.release_weight
+        )
+    except executor.QueueFull:
+        ticket.release()
+        raise
+    job.add_done_callback(lambda _: ticket.release())
+    return await asyncio.wrap_future(job)
+
+
+async def save_message(chat_id: str, role: str, text: str):
+    """storage.store.save_message (a locking SQLite write) off the event loop."""
+    await asyncio.to_thread(storage.store.save_message, chat_id, role, text)
+
+
+async def admit_medical(msg: str, client: str, chat_id: str, use_cache: bool = True,
+                        on_event=None):
+    """
+    Queue the case, then save the user turn; a failed save gives the ticket back.
+    A case identical to one already running joins that run instead and gets
+    its Future rather than a ticket, so it holds no scheduler weight and no
+    worker thread while it waits.
+    """
+    joined = None
+    if use_cache:
+        joined = await asyncio.to_thread(crew_runner.join_inflight, msg, on_event)
+    admitted = joined or await enqueue_medical(msg, client)
+    try:
+        await save_message(chat_id, "user", msg)
+    except BaseException:
+        if joined is None:
+            admitted.release()
+        raise
+    return admitted
+
+
 # --------------------------
 # Chat Endpoint (Medical + General)
 # --------------------------
 @app.post("/api/chat", response_model=ChatResponse)
-async def chat(req: ChatRequest):
+async def chat(req: ChatRequest, request: Request):
     chat_id = req.chat_id
     msg = req.message.strip()
+    client = client_key(request, chat_id)
 
     if not msg:
         raise HTTPException(400, "Message cannot be empty.")
 
     # MEDICAL MODE
     if is_medical(msg):
-        chatbot.save_message(chat_id, "user", msg)
+        # Admission first: a rejected request leaves no orphan user message
+        admitted = await admit_medical(msg, client, chat_id, not req.no_cache)
 
-        try:
-            result = run_mdagents(msg)
-
-            reasoning = "\n".join(f"- {r}" for r in result.get("reasoning", []))
-            final = result.get("final", "No final output provided.")
-            complexity = result.get("complexity", "Unknown")
-
-            reply = (
-                f"Medical Reasoning (Educational Only)\n\n"
-                f"Complexity: {complexity}\n\n"
-                f"Reasoning:\n{reasoning}\n\n"
-                f"Final Opinion:\n{final}\n\n"
-                "⚠ Not a substitute for real medical advice."
-            )
-
-        except APIError:
-            # OpenRouter / token / credit issue
-            reply = (
-                "⚠ Medical AI service is temporarily unavailable due to usage limits.\n\n"
-                "Please try again later."
-            )
-
-        except Exception:
-            # Any unexpected error
-            traceback.print_exc()
-            reply = "⚠ An internal error occurred while processing the medical query."
-
-        chatbot.save_message(chat_id, "assistant", reply)
+        reply = await run_medical(admitted, msg, None, not req.no_cache, chat_id)
+
+        await save_message(chat_id, "assistant", reply)
         return ChatResponse(reply=reply, is_medical=True)
 
-    # GENERAL CHAT MODE
-    reply = chatbot.general_reply(chat_id, msg)
+    # GENERAL CHAT MODE (async I/O on the shared connection pool)
+    async with scheduler.scheduler.slot("chat", client):
+        reply = await chatbot.general_reply_async(chat_id, msg)
     return ChatResponse(reply=reply, is_medical=False)
 
+# --------------------------
+# Streaming Chat Endpoint (Server-Sent Events)
+# --------------------------
+# Events, in order:
+#   start       {"is_medical": bool}             sent immediately
+#   complexity  {"complexity": "HIGH"}           medical only
+#   round       {"role": ..., "summary": ...}    medical only, per specialist
+#   token       {"text": ...}                    reply text (incremental for chat)
+#   done        {}
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+# Medical runs outlive a disconnected stream; keep them referenced until done
+background: set[asyncio.Task] = set()
+
+
+def sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def stream_general(chat_id: str, msg: str, client: str):
+    yield sse("start", {"is_medical": False})
+    try:
+        ticket = scheduler.scheduler.enqueue("chat", client)
+    except executor.QueueFull:
+        yield sse("token", {"text": BUSY_REPLY})
+        yield sse("done", {})
+        return
+    try:
+        await ticket.wait()
+        async for token in chatbot.stream_general_reply(chat_id, msg):
+            yield sse("token", {"text": token})
+    finally:
+        ticket.release()
+    yield sse("done", {})
+
+
+async def stream_medical(done: asyncio.Future, events: asyncio.Queue):
+    yield sse("start", {"is_medical": True})
+
+    while True:
+        getter = asyncio.ensure_future(events.get())
+        finished, _ = await asyncio.wait({getter, done}, return_when=asyncio.FIRST_COMPLETED)
+        if getter in finished:
+            kind, data = getter.result()
+            yield sse(kind, data)
+            continue
+        getter.cancel()
+        break
+
+    while not events.empty():
+        kind, data = events.get_nowait()
+        yield sse(kind, data)
+
+    yield sse("token", {"text": done.result()})
+    yield sse("done", {})
+
+
+@app.post("/api/chat/stream")
+async def chat_stream(req: ChatRequest, request: Request):
+    chat_id = req.chat_id
+    msg = req.message.strip()
+    client = client_key(request, chat_id)
+
+    if not msg:
+        raise HTTPException(400, "Message cannot be empty.")
+
+    if not is_medical(msg):
+        return StreamingResponse(
+            stream_general(chat_id, msg, client), media_type="text/event-stream",
+            headers=SSE_HEADERS,
+        )
+
+    loop = asyncio.get_running_loop()
+    events: asyncio.Queue = asyncio.Queue()
+
+    def on_event(kind, data):
+        loop.call_soon_threadsafe(events.put_nowait, (kind, data))
+
+    async def run_and_save(admitted):
+        # A background task: the reply is saved even if the client disconnects
+        try:
+            reply = await run_medical(admitted, msg, on_event, not req.no_cache, chat_id)
+        except executor.QueueFull:
+            return BUSY_REPLY  # shown on the stream, not saved as a reply
+        await save_message(chat_id, "assistant", reply)
+        return reply
+
+    admitted = await admit_medical(msg, client, chat_id, not req.no_cache, on_event)
+    task = asyncio.ensure_future(run_and_save(admitted))
+    background.add(task)
+    task.add_done_callback(background.discard)
+
+    return StreamingResponse(
+        stream_medical(task, events), media_type="text/event-stream", headers=SSE_HEADERS
+    )
+
+# --------------------------
+# Batch Case Submission (NDJSON out, completion order)
+# --------------------------
+def parse_batch(body: bytes, content_type: str):
+    """
+    Accepts either
+      application/json   {"cases": [...], "no_cache": false}  (or a bare list)
+      anything else      JSONL, one case per line
+    where a case is a string or {"message": "..."}.
+    Returns ([(text | None, error | None), ...], no_cache).
+    """
+    no_cache = False
+    if content_type.startswith("application/json"):
+        data = json.loads(body or b"null")
+        if isinstance(data, dict):
+            no_cache = bool(data.get("no_cache", False))
+            data = data.get("cases")
+        if not isinstance(data, list):
+            raise ValueError('Expected a list of cases or {"cases": [...]}.')
+        items = data
+    else:
+        items = []
+        for line in body.decode("utf-8").splitlines():
+            if not line.strip():
+                continue
+            try:
+                items.append(json.loads(line))
+            except ValueError as e:
+                items.append(e)
+
+    cases = []
+    for item in items:
+        if isinstance(item, dict):
+            item = item.get("message")
+        if isinstance(item, str):
+            cases.append((item, None))
+        elif isinstance(item, ValueError):
+            cases.append((None, f"Invalid JSON line: {item}"))
+        else:
+            cases.append((None, 'Case must be a string or {"message": "..."}.'))
+    return cases, no_cache
+
+
+@app.post("/api/chat/batch")
+async def chat_batch(request: Request):
+    client = request.headers.get("x-client-id") or "batch"
+    try:
+        cases, no_cache = parse_batch(
+            await request.body(), request.headers.get("content-type", "")
+        )
+    except (ValueError, UnicodeDecodeError) as e:
+        raise HTTPException(400, f"Invalid batch body: {e}")
+
+    if len(cases) > BATCH_MAX_CASES:
+        raise HTTPException(413, f"At most {BATCH_MAX_CASES} cases per batch.")
+
+    def admit(query: str):
+        # Each case waits for its own ticket, on the batch's worker thread
+        klass, weight = medical_class(query)
+        return scheduler.scheduler.hold(klass, client, weight)
+
+    def results():
+        valid = []
+        for index, (text, error) in enumerate(cases):
+            if error:
+                yield json.dumps({"index": index, "ok": False, "error": error}) + "\n"
+            else:
+                valid.append((index, text))
+
+        if valid:
+            indices, queries = zip(*valid)
+            for item in run_batch(queries, use_cache=not no_cache, indices=indices,
+                                  admit=admit):
+                yield json.dumps(item) + "\n"
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
+# --------------------------
+# Async medical cases (persistent job queue, see jobs.py)
+# --------------------------
+@app.post("/api/cases", status_code=202)
+def submit_case(req: CaseRequest):
+    query = req.query.strip()
+    if not query:
+        raise HTTPException(400, "Case text cannot be empty.")
+    job_id = jobs.store.enqueue(query, use_cache=not req.no_cache)
+    return {"id": job_id, "status": jobs.QUEUED}
+
+@app.get("/api/cases/{job_id}")
+def get_case(job_id: str):
+    job = jobs.store.get(job_id)
+    if job is None:
+        raise HTTPException(404, "Case not found.")
+    return job
+
+# --------------------------
+# Full-text search over all chats
+# --------------------------
+@app.get("/api/search")
+def search(q: str = Query(..., min_length=1, max_length=500),
+           limit: int = Query(20, ge=1, le=100),
+           offset: int = Query(0, ge=0, le=10000)):
+    rows, next_offset = storage.store.search_messages(q, limit, offset)
+    return {
+        "query": q,
+        "results": [
+            {
+                "chat_id": chat_id,
+                "title": title,
+                "message_id": message_id,
+                "role": role,
+                "snippet": snippet,
+                "timestamp": ts,
+                "score": score,
+            }
+            for chat_id, title, message_id, role, snippet, ts, score in rows
+        ],
+        "next_offset": next_offset,
+    }
+
 # --------------------------
 # Get chat history
 # --------------------------
 @app.get("/api/history/{chat_id}")
-def get_chat_history(chat_id: str):
-    history = chatbot.get_history(chat_id)
-    formatted = [
-        {"role": r, "message": m, "timestamp": ts}
-        for r, m, ts in history
-    ]
-    return {"chat_id": chat_id, "history": formatted}
+def get_chat_history(chat_id: str, request: Request,
+                     before: int | None = Query(None, ge=1),
+                     after: int | None = Query(None, ge=0),
+                     limit: int | None = Query(None, ge=1, le=1000)):
+    """
+    Messages oldest first. With no parameters the whole chat, as before.
+    `limit` alone gives the newest page and `before=<id>&limit=N` the page
+    above it; `after=<id>` reads forward from a message. `has_more` says
+    whether there is more in the paging direction.
+
+    The latest message id is the ETag, so an unchanged chat gets a 304.
+    """
+    last = storage.store.last_message(chat_id)
+    etag = f'W/"{last[0] if last else 0}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    if last:
+        modified = datetime.fromisoformat(last[1].replace("Z", "+00:00"))
+        headers["Last-Modified"] = format_datetime(modified, usegmt=True)
+    if not_modified(request, etag, headers.get("Last-Modified")):
+        return Response(status_code=304, headers=headers)
+    if last:
+        # Stop at the message the validator describes
+        before = min(before or last[0] + 1, last[0] + 1)
+
+    rows = storage.store.iter_history(chat_id, before, after, None if limit is None else limit + 1)
+    more = False
+    if limit is not None and after is None:
+        # Newest page: the one extra row is the oldest and only says there is more above
+        rows = list(rows)
+        more = len(rows) > limit
+        rows = rows[1:] if more else rows
+
+    def body():
+        nonlocal more
+        buf = ['{"chat_id": %s, "history": [' % json.dumps(chat_id)]
+        size = 0
+        for i, (message_id, role, message, ts) in enumerate(rows):
+            if i == limit:
+                more = True
+                break
+            item = json.dumps({"id": message_id, "role": role, "message": message, "timestamp": ts})
+            buf.append("," + item if i else item)
+            size += len(item)
+            if size >= HISTORY_CHUNK_BYTES:
+                yield "".join(buf).encode()
+                buf, size = [], 0
+        buf.append('], "has_more": %s}' % json.dumps(more))
+        yield "".join(buf).encode()
+
+    return json_stream_response(body(), request, headers)
 
 # --------------------------
 # Delete chat history
@@ -168,6 +601,46 @@ def delete_chat_history(chat_id: str):
     chatbot.delete_history(chat_id)
     return {"status": "deleted", "chat_id": chat_id}
 
+# --------------------------
+# Worker pool stats (deployment sizing)
+# --------------------------
+@app.get("/api/stats")
+def stats():
+    cache = result_cache.cache
+    return {
+        "workers": executor.pool.stats(),
+        "scheduler": scheduler.scheduler.stats(),
+        "result_cache": cache.stats() if cache else None,
+    }
+
+# --------------------------
+# Prometheus metrics
+# --------------------------
+metrics.Gauge(
+    "worker_pool", "Medical worker pool occupancy and limits.", ["state"],
+    lambda: {(name,): value for name, value in executor.pool.stats().items()},
+)
+def scheduler_gauge():
+    stats = scheduler.scheduler.stats()
+    values = {("capacity", ""): stats["capacity"], ("in_flight", ""): stats["in_flight"],
+              ("workers_in_use", ""): stats["workers_in_use"]}
+    values.update({("queued", klass): n for klass, n in stats["queued"].items()})
+    return values
+
+metrics.Gauge(
+    "llm_scheduler", "Scheduler capacity, weight in flight and tickets queued per class (this process).",
+    ["state", "klass"], scheduler_gauge,
+)
+metrics.Gauge(
+    "mdagents_result_cache", "Result cache hits, misses and entries.", ["kind"],
+    lambda: {(name,): value for name, value in result_cache.cache.stats().items()}
+    if result_cache.cache else {},
+)
+
+@app.get("/metrics")
+def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/")
 def home():
     return {"status": "backend running"}
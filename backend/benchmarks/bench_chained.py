@@ -0,0 +1,90 @@
+# benchmarks/bench_chained.py
+"""
+LLM calls and prompt tokens per case: "rounds" vs "chained" pipeline mode.
+
+No API calls are made: Crew.kickoff is replaced by a fake that answers
+the moderator with the tier under test and counts every call and the
+prompt tokens it would have sent (shared case prefix + task description
++ expected output, estimated like context.estimate_tokens). "cacheable"
+is the part a provider prompt cache can serve: the case prefix of every
+call after the first. The fake specialist output is deliberately long
+so the digest budget matters.
+
+    python benchmarks/bench_chained.py --digest-tokens 120
+
+For end-to-end numbers through CrewAI and litellm, run loadtest.py with
+MDAGENTS_MODE=rounds and then chained, and compare its prompt tok/req column.
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import crewai  # noqa: E402
+import crew_runner  # noqa: E402
+import tasks  # noqa: E402
+from context import estimate_tokens  # noqa: E402
+
+CASE = (
+    "58-year-old with three days of fever, right upper quadrant pain and "
+    "jaundice. Hypotensive on arrival; ultrasound shows a dilated common "
+    "bile duct. Background of type 2 diabetes."
+)
+SPECIALIST_OUTPUT = (
+    "Updated Diagnosis: acute ascending cholangitis with early sepsis. "
+    "Reasoning: Charcot's triad with hypotension points to obstructed biliary drainage. "
+    + "Supporting detail on investigations, differentials and monitoring. " * 30
+)
+
+
+class Counter:
+    calls = 0
+    prompt_tokens = 0
+    cacheable = 0
+
+
+def make_fake_crew(tier: str):
+    class FakeCrew:
+        def __init__(self, agents, tasks, verbose=False, **kwargs):
+            self.tasks = tasks
+
+        def kickoff(self, *args, **kwargs):
+            task = self.tasks[0]
+            prefix = estimate_tokens(tasks.current_case())
+            if Counter.calls:
+                Counter.cacheable += prefix
+            Counter.calls += 1
+            Counter.prompt_tokens += prefix + estimate_tokens(task.description + task.expected_output)
+            if task.expected_output.startswith("One word"):
+                return tier
+            return SPECIALIST_OUTPUT
+
+    return FakeCrew
+
+
+def bench(tier: str, mode: str) -> tuple[int, int, int]:
+    # crew_runner imports Crew from crewai at call time
+    crewai.Crew = make_fake_crew(tier)
+    pipeline = crew_runner.MDAgentsPipeline(pool_size=1, mode=mode)
+    Counter.calls = Counter.prompt_tokens = Counter.cacheable = 0
+    result = pipeline.run(CASE, concurrency=1)
+    assert result["complexity"] == tier.upper()
+    return Counter.calls, Counter.prompt_tokens, Counter.cacheable
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--digest-tokens", type=int, default=crew_runner.DIGEST_TOKENS)
+    args = parser.parse_args()
+    crew_runner.DIGEST_TOKENS = args.digest_tokens
+
+    print(f"{'tier':<10}{'mode':<9}{'calls':>6}{'prompt tok':>12}{'cacheable':>11}")
+    for tier in ("Low", "Moderate", "High"):
+        for mode in ("rounds", "chained"):
+            calls, tokens, cacheable = bench(tier, mode)
+            print(f"{tier.upper():<10}{mode:<9}{calls:>6}{tokens:>12}{cacheable:>11}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+# benchmarks/bench_concurrency.py
+"""
+Chat store under concurrent load: throughput and latency of a mixed
+read/write workload through storage.store as the thread count grows.
+
+Each worker loops for --seconds over a chat picked at random: mostly
+reads (newest history page, sidebar page, last message) and a share of
+--write-ratio writes (save_message). With --processes N the same load
+runs in N processes on one database file at once, like N uvicorn
+workers; "errors" counts any exception, e.g. "database is locked".
+
+    python benchmarks/bench_concurrency.py --threads 1,2,4,8,16,32 --processes 2
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def child(args):
+    sys.path.insert(0, BACKEND)
+    import storage
+
+    store = storage.store
+    deadline = time.monotonic() + args.seconds
+    lock = threading.Lock()
+    latencies = {"read": [], "write": []}
+    errors = []
+
+    def work(seed: int):
+        rng = random.Random(seed)
+        mine = {"read": [], "write": []}
+        failed = 0
+        while time.monotonic() < deadline:
+            chat_id = f"chat-{rng.randrange(args.chats)}"
+            kind = "write" if rng.random() < args.write_ratio else "read"
+            t = time.perf_counter()
+            try:
+                if kind == "write":
+                    store.save_message(chat_id, "user", f"stress {seed} {t}")
+                else:
+                    op = rng.randrange(3)
+                    if op == 0:
+                        list(store.iter_history(chat_id, limit=50))
+                    elif op == 1:
+                        store.list_chats(50)
+                    else:
+                        store.last_message(chat_id)
+            except Exception:
+                failed += 1
+                continue
+            mine[kind].append((time.perf_counter() - t) * 1000)
+        with lock:
+            for k in mine:
+                latencies[k].extend(mine[k])
+            errors.append(failed)
+
+    threads = [
+        threading.Thread(target=work, args=(args.seed * 1000 + i,))
+        for i in range(args.thread_count)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    print(json.dumps({
+        "reads": latencies["read"],
+        "writes": latencies["write"],
+        "errors": sum(errors),
+        "connections": store.pool.size(),
+    }))
+
+
+def prefill(rows: int, chats: int):
+    sys.path.insert(0, BACKEND)
+    import storage
+
+    ts = "2025-01-01T00:00:00Z"
+    with storage.store.pool.transaction() as conn:
+        conn.executemany(
+            "INSERT INTO messages (chat_id, role, message, created_at) VALUES (?, ?, ?, ?)",
+            (
+                (f"chat-{i % chats}", "user" if i % 2 == 0 else "assistant", f"message {i}", ts)
+                for i in range(rows)
+            ),
+        )
+        for i in range(chats):
+            storage.touch_chat(conn, f"chat-{i}", "user", f"chat {i}", ts)
+    storage.store.close()
+
+
+def p95(values):
+    values = sorted(values)
+    return values[max(0, int(len(values) * 0.95) - 1)] if values else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--threads", default="1,2,4,8,16,32")
+    parser.add_argument("--processes", type=int, default=1)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--chats", type=int, default=2_000)
+    parser.add_argument("--write-ratio", type=float, default=0.2)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--thread-count", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--seed", type=int, default=0, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        return child(args)
+
+    tmp = tempfile.mkdtemp(prefix="mdagents-concurrency-")
+    os.environ["CHAT_DB_PATH"] = os.path.join(tmp, "chat.db")
+    prefill(args.rows, args.chats)
+
+    print(f"processes {args.processes}  write ratio {args.write_ratio:.0%}  {args.seconds:.0f}s per level")
+    print(f"{'threads':>8}{'ops/s':>10}{'reads/s':>10}{'writes/s':>10}"
+          f"{'read p95 ms':>13}{'write p95 ms':>14}{'errors':>8}")
+    for count in (int(n) for n in args.threads.split(",")):
+        children = [
+            subprocess.Popen(
+                [sys.executable, __file__, "--child", "--thread-count", str(count),
+                 "--seed", str(p), "--seconds", str(args.seconds),
+                 "--chats", str(args.chats), "--write-ratio", str(args.write_ratio)],
+                stdout=subprocess.PIPE, env=os.environ,
+            )
+            for p in range(args.processes)
+        ]
+        results = [json.loads(c.communicate()[0]) for c in children]
+        reads = [x for r in results for x in r["reads"]]
+        writes = [x for r in results for x in r["writes"]]
+        errors = sum(r["errors"] for r in results)
+        print(
+            f"{count * args.processes:>8}{(len(reads) + len(writes)) / args.seconds:>10,.0f}"
+            f"{len(reads) / args.seconds:>10,.0f}{len(writes) / args.seconds:>10,.0f}"
+            f"{p95(reads):>13.2f}{p95(writes):>14.2f}{errors:>8}"
+        )
+
+
+if __name__ == "__main__":
+    main()
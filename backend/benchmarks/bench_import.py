@@ -0,0 +1,94 @@
+# benchmarks/bench_import.py
+"""
+Cold import cost of the server and CLI entry points, from
+`python -X importtime`, plus a guard that the heavy MDAgents stack
+(crewai, litellm) is not pulled in by importing them.
+
+Each module is imported --repeat times in a fresh interpreter; the
+median cumulative time is reported with the slowest imports under it.
+Exits non-zero when a module imports a forbidden package or goes over
+--budget-ms, so it can run in CI:
+
+    python benchmarks/bench_import.py --budget-ms 1500
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# module → packages it must not import (loaded lazily on first medical use)
+MODULES = {
+    "api_server": ("crewai", "litellm"),
+    "main": ("crewai", "litellm"),
+    "chatbot": ("crewai", "litellm"),
+    "crew_runner": ("crewai", "litellm"),
+    "agents": (),
+}
+
+
+def import_profile(module: str, env: dict) -> list[tuple[int, int, str]]:
+    """[(self µs, cumulative µs, name), ...] for one cold import."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND, env=env, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|")
+        rows.append((int(own), int(cumulative), name.rstrip()))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--modules", default=",".join(MODULES))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--top", type=int, default=5, help="slowest imports to list per module")
+    parser.add_argument("--budget-ms", type=float, default=0,
+                        help="fail when a guarded module's median exceeds this (0 = off)")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="mdagents-import-")
+    env = dict(
+        os.environ,
+        OPENROUTER_API_KEY=os.getenv("OPENROUTER_API_KEY", "bench"),
+        CHAT_DB_PATH=os.path.join(tmp, "chat.db"),
+        LITELLM_LOCAL_MODEL_COST_MAP="True",
+    )
+
+    failures = []
+    print(f"{'module':<14}{'median ms':>11}{'min ms':>9}  heavy imports")
+    for module in args.modules.split(","):
+        runs = [import_profile(module, env) for _ in range(args.repeat)]
+        totals = [next(c for _, c, name in rows if name.strip() == module) / 1000 for rows in runs]
+        median = statistics.median(totals)
+
+        names = {name.strip() for _, _, name in runs[0]}
+        forbidden = MODULES.get(module, ())
+        pulled = [pkg for pkg in ("crewai", "litellm") if pkg in names]
+        print(f"{module:<14}{median:>11.0f}{min(totals):>9.0f}  {', '.join(pulled) or '-'}")
+
+        for own, cumulative, name in sorted(runs[0], key=lambda r: -r[0])[:args.top]:
+            print(f"{'':<14}{own / 1000:>11.1f}  self: {name.strip()}")
+
+        for pkg in pulled:
+            if pkg in forbidden:
+                failures.append(f"{module} imports {pkg}")
+        if args.budget_ms and forbidden and median > args.budget_ms:
+            failures.append(f"{module} took {median:.0f} ms (budget {args.budget_ms:.0f} ms)")
+
+    for failure in failures:
+        print("FAIL:", failure)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+# benchmarks/bench_rounds.py
+"""
+Wall-clock benchmark for the specialist rounds in run_mdagents.
+
+No API calls are made: Crew.kickoff is replaced by a fake that sleeps
+for a fixed "LLM latency" and answers the moderator with the tier
+under test.
+
+    python benchmarks/bench_rounds.py --latency 0.5 --concurrency 4
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import crewai  # noqa: E402
+import crew_runner  # noqa: E402
+
+
+def make_fake_crew(tier: str, latency: float):
+    class FakeCrew:
+        def __init__(self, agents, tasks, verbose=False, **kwargs):
+            self.tasks = tasks
+
+        def kickoff(self, *args, **kwargs):
+            time.sleep(latency)
+            if self.tasks[0].expected_output.startswith("One word"):
+                return tier
+            return "Finding one. Finding two. Finding three."
+
+    return FakeCrew
+
+
+def bench(tier: str, latency: float, concurrency: int, repeat: int) -> float:
+    # crew_runner imports Crew from crewai at call time
+    crewai.Crew = make_fake_crew(tier, latency)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = crew_runner.run_mdagents("benchmark case", concurrency=concurrency, use_cache=False)
+        assert result["complexity"] == tier.upper()
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--latency", type=float, default=0.5, help="fake seconds per LLM call")
+    parser.add_argument("--concurrency", type=int, default=crew_runner.ROUND_CONCURRENCY)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    # Untimed warm-up: building the agent sets and the first crew would
+    # otherwise land in the first sequential measurement
+    crew_runner.get_pipeline().warm()
+    bench("Moderate", 0, 1, 1)
+
+    print(f"{'tier':<10}{'sequential':>12}{'concurrent':>12}{'speedup':>10}")
+    for tier in ("Moderate", "High"):
+        seq = bench(tier, args.latency, 1, args.repeat)
+        par = bench(tier, args.latency, args.concurrency, args.repeat)
+        print(f"{tier.upper():<10}{seq:>11.2f}s{par:>11.2f}s{seq / par:>9.2f}x")
+
+
+if __name__ == "__main__":
+    main()
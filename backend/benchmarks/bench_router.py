@@ -0,0 +1,75 @@
+# benchmarks/bench_router.py
+"""
+Medical-intent routing: throughput and accuracy of router.py against the
+legacy substring checks from api_server.py / main.py, on a labelled
+corpus (routing_corpus.jsonl, one {"text", "medical"} object per line).
+
+Every false positive is a chat message that would have been sent
+through the six-call MDAgents pipeline.
+
+    python benchmarks/bench_router.py --repeat 2000
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+import router  # noqa: E402
+
+LEGACY_API = [
+    "pain", "fever", "infection", "diagnose", "treatment", "sepsis",
+    "scan", "mri", "ct", "injury", "cancer", "stroke",
+]
+LEGACY_CLI = ["pain", "fever", "diagnose", "treatment"]
+PIPELINE_CALLS = 6
+
+
+def legacy(keywords):
+    def classify_many(texts):
+        return [any(k in text.lower() for k in keywords) for text in texts]
+    return classify_many
+
+
+def evaluate(name, classify_many, texts, labels, repeat):
+    predictions = classify_many(texts)
+    fp = sum(p and not y for p, y in zip(predictions, labels))
+    fn = sum(y and not p for p, y in zip(predictions, labels))
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        classify_many(texts)
+    rate = len(texts) * repeat / (time.perf_counter() - start)
+
+    print(f"{name:<12}{rate:>14,.0f}{fp:>6}{fn:>6}")
+    return fp
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--corpus", default=os.path.join(HERE, "routing_corpus.jsonl"))
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    with open(args.corpus) as f:
+        rows = [json.loads(line) for line in f if line.strip()]
+    texts = [r["text"] for r in rows]
+    labels = [r["medical"] for r in rows]
+    chat = len(labels) - sum(labels)
+
+    print(f"corpus: {len(rows)} messages ({sum(labels)} medical, {chat} chat)\n")
+    print(f"{'router':<12}{'msgs/sec':>14}{'FP':>6}{'FN':>6}")
+    legacy_fp = evaluate("legacy-api", legacy(LEGACY_API), texts, labels, args.repeat)
+    evaluate("legacy-cli", legacy(LEGACY_CLI), texts, labels, args.repeat)
+    new_fp = evaluate("router", router.classify_many, texts, labels, args.repeat)
+
+    avoided = legacy_fp - new_fp
+    print(f"\npipeline runs avoided vs legacy-api: {avoided} "
+          f"({avoided * PIPELINE_CALLS} LLM calls, {avoided / max(chat, 1):.0%} of chat messages)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+# benchmarks/bench_scheduler.py
+"""
+Queue wait per class under a flood of heavy cases: scheduler.Scheduler
+versus one FIFO queue with the same in-flight limit.
+
+Simulated work only (no LLM): one client submits --flood HIGH cases at
+once (weight = parallel rounds, each lasting --case-seconds), while
+--chatters other clients send a quick chat reply (--chat-seconds) every
+--chat-interval seconds, plus an occasional LOW case.
+
+    python benchmarks/bench_scheduler.py --capacity 15 --flood 20
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("OPENROUTER_API_KEY", "bench")
+
+import scheduler
+
+
+class Fifo:
+    """One queue, first come first served, same weight accounting."""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.in_use = 0
+        self.queue = []  # (weight, future)
+
+    async def acquire(self, weight: int):
+        future = asyncio.get_running_loop().create_future()
+        self.queue.append((weight, future))
+        self._dispatch()
+        await future
+
+    def release(self, weight: int):
+        self.in_use -= weight
+        self._dispatch()
+
+    def _dispatch(self):
+        while self.queue and self.in_use + self.queue[0][0] <= self.capacity:
+            weight, future = self.queue.pop(0)
+            self.in_use += weight
+            future.set_result(None)
+
+
+async def simulate(args, use_scheduler: bool) -> dict:
+    sched = scheduler.Scheduler(args.capacity, max_queue=10_000)
+    fifo = Fifo(args.capacity)
+    waits = {klass: [] for klass in scheduler.CLASSES}
+
+    async def job(klass: str, client: str, weight: int, seconds: float):
+        start = time.monotonic()
+        if use_scheduler:
+            ticket = sched.enqueue(klass, client, weight)
+            await ticket.wait()
+        else:
+            await fifo.acquire(weight)
+        waits[klass].append(time.monotonic() - start)
+        await asyncio.sleep(seconds)
+        if use_scheduler:
+            ticket.release()
+        else:
+            fifo.release(weight)
+
+    rng = random.Random(0)
+    jobs = [
+        asyncio.create_task(job("HIGH", "flooder", 4, args.case_seconds))
+        for _ in range(args.flood)
+    ]
+    deadline = time.monotonic() + args.duration
+    while time.monotonic() < deadline:
+        await asyncio.sleep(args.chat_interval)
+        client = f"user-{rng.randrange(args.chatters)}"
+        if rng.random() < 0.1:
+            jobs.append(asyncio.create_task(job("LOW", client, 1, args.case_seconds / 3)))
+        else:
+            jobs.append(asyncio.create_task(job("chat", client, 1, args.chat_seconds)))
+    await asyncio.gather(*jobs)
+    return waits
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--capacity", type=int, default=15)
+    parser.add_argument("--flood", type=int, default=20)
+    parser.add_argument("--case-seconds", type=float, default=1.0)
+    parser.add_argument("--chat-seconds", type=float, default=0.1)
+    parser.add_argument("--chat-interval", type=float, default=0.05)
+    parser.add_argument("--chatters", type=int, default=10)
+    parser.add_argument("--duration", type=float, default=3.0)
+    args = parser.parse_args()
+
+    print(f"{'policy':<11}{'class':<10}{'jobs':>6}{'wait p50 s':>12}{'wait p95 s':>12}")
+    for name, use_scheduler in (("fifo", False), ("scheduler", True)):
+        waits = asyncio.run(simulate(args, use_scheduler))
+        for klass, values in waits.items():
+            if not values:
+                continue
+            values.sort()
+            p95 = values[max(0, int(len(values) * 0.95) - 1)]
+            print(f"{name:<11}{klass:<10}{len(values):>6}"
+                  f"{statistics.median(values):>12.3f}{p95:>12.3f}")
+
+
+if __name__ == "__main__":
+    main()
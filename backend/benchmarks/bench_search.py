@@ -0,0 +1,127 @@
+# benchmarks/bench_search.py
+"""
+Full-text search over a large chat store: indexing cost, backfill time
+and storage search_messages latency versus a LIKE scan.
+
+Builds a fresh database with --rows messages (default 2M) of synthetic
+clinical-ish text spread over --chats chats. Rows go in with the FTS
+triggers active, so the insert rate includes index maintenance; the
+index is then rebuilt from scratch to time the migration backfill.
+
+    python benchmarks/bench_search.py --rows 2000000 --queries 200
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+TERMS = (
+    "fever cough dyspnoea sepsis pneumonia cholangitis jaundice appendicitis "
+    "fracture stroke migraine seizure anaemia diabetes hypertension asthma "
+    "ultrasound radiograph biopsy culture antibiotics analgesia steroids "
+    "insulin surgery referral follow-up monitoring discharge"
+).split()
+FILLER = (
+    "the patient reports and was with for since denies has presenting noted "
+    "today history of mild severe acute chronic left right pain swelling"
+).split()
+
+
+def synthetic_message(rng: random.Random) -> str:
+    words = rng.choices(FILLER, k=rng.randint(8, 40))
+    for _ in range(rng.randint(1, 3)):
+        words.insert(rng.randrange(len(words)), rng.choice(TERMS))
+    # Rare tokens so some searches are selective
+    words.append(f"ref{rng.randrange(1_000_000)}")
+    return " ".join(words)
+
+
+def percentiles(values):
+    """(p50, p95), interpolated, so p95 >= p50 even for a handful of samples."""
+    if len(values) < 2:
+        return values[0], values[0]
+    cuts = statistics.quantiles(values, n=20, method="inclusive")
+    return statistics.median(values), cuts[-1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    parser.add_argument("--chats", type=int, default=20_000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--like-queries", type=int, default=5)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="mdagents-search-")
+    os.environ.update({
+        "CHAT_DB_PATH": os.path.join(tmp, "chat.db"),
+        "CHAT_DB_WRITE_BEHIND": "0",
+    })
+    sys.path.insert(0, BACKEND)
+    import storage
+
+    store = storage.store
+    db = store.pool.connection()
+    rng = random.Random(0)
+    ts = "2025-01-01T00:00:00Z"
+
+    start = time.perf_counter()
+    batch = 50_000
+    for first in range(0, args.rows, batch):
+        with store.pool.transaction() as conn:
+            conn.executemany(
+                "INSERT INTO messages (chat_id, role, message, created_at) VALUES (?, ?, ?, ?)",
+                (
+                    (f"chat-{i % args.chats}", "user" if i % 2 == 0 else "assistant",
+                     synthetic_message(rng), ts)
+                    for i in range(first, min(first + batch, args.rows))
+                ),
+            )
+    insert_rate = args.rows / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with store.pool.transaction() as conn:
+        conn.execute("INSERT INTO messages_fts (messages_fts) VALUES ('rebuild')")
+    rebuild = time.perf_counter() - start
+
+    print(f"rows {args.rows:,}  insert+index {insert_rate:,.0f} rows/s  backfill {rebuild:.1f}s")
+    print(f"{'query kind':<22}{'p50 ms':>10}{'p95 ms':>10}{'hits/page':>11}")
+
+    kinds = {
+        "common term": lambda: rng.choice(TERMS),
+        "two terms": lambda: f"{rng.choice(TERMS)} {rng.choice(TERMS)}",
+        "prefix": lambda: rng.choice(TERMS)[:4] + "*",
+        "rare token": lambda: f"ref{rng.randrange(1_000_000)}",
+        "page 5 (offset 80)": lambda: rng.choice(TERMS),
+    }
+    for kind, make in kinds.items():
+        offset = 80 if kind.startswith("page") else 0
+        latencies, hits = [], []
+        for _ in range(args.queries):
+            text = make()
+            t = time.perf_counter()
+            rows, _ = store.search_messages(text, 20, offset)
+            latencies.append((time.perf_counter() - t) * 1000)
+            hits.append(len(rows))
+        p50, p95 = percentiles(latencies)
+        print(f"{kind:<22}{p50:>10.2f}{p95:>10.2f}{statistics.mean(hits):>11.1f}")
+
+    latencies = []
+    for _ in range(args.like_queries):
+        term = f"ref{rng.randrange(1_000_000)}"
+        t = time.perf_counter()
+        db.execute(
+            "SELECT id FROM messages WHERE message LIKE ? LIMIT 21", (f"%{term}%",)
+        ).fetchall()
+        latencies.append((time.perf_counter() - t) * 1000)
+    p50, p95 = percentiles(latencies)
+    print(f"{'LIKE scan (rare)':<22}{p50:>10.2f}{p95:>10.2f}{'':>11}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+# benchmarks/bench_setup.py
+"""
+Micro-benchmark of per-request pipeline setup overhead (no LLM calls).
+
+before: create_agents() + create_tasks() on every request
+after:  MDAgentsPipeline agent-set checkout + create_tasks()
+
+    python benchmarks/bench_setup.py --repeat 200
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agents import create_agents  # noqa: E402
+from tasks import create_tasks  # noqa: E402
+from crew_runner import MDAgentsPipeline  # noqa: E402
+
+CASE = (
+    "A 54-year-old man presents with fever, right upper quadrant pain and "
+    "jaundice for three days. CT shows a dilated common bile duct."
+)
+
+
+def per_call(fn, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    def before():
+        create_tasks(create_agents())
+
+    pipeline = MDAgentsPipeline(pool_size=1)
+    pipeline.warm()
+
+    def after():
+        with pipeline.checkout() as agents:
+            create_tasks(agents)
+
+    old = per_call(before, args.repeat)
+    new = per_call(after, args.repeat)
+    print(f"before: {old:8.3f} ms/request")
+    print(f"after:  {new:8.3f} ms/request  ({old / new:.1f}x less setup)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+# benchmarks/bench_storage.py
+"""
+Chat store throughput: inserts/sec through save_message and get_history
+latency on a large messages table, for direct vs write-behind storage.
+
+Each mode runs in its own process on a fresh database prefilled with
+--rows messages (default 1M) spread over --chats chats.
+
+    python benchmarks/bench_storage.py --rows 1000000 --inserts 20000
+"""
+import argparse
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def prefill(pool, rows: int, chats: int):
+    ts = "2025-01-01T00:00:00Z"
+    batch = 50_000
+    for start in range(0, rows, batch):
+        with pool.transaction() as conn:
+            conn.executemany(
+                "INSERT INTO messages (chat_id, role, message, created_at) VALUES (?, ?, ?, ?)",
+                (
+                    (f"chat-{i % chats}", "user" if i % 2 == 0 else "assistant", f"message {i}", ts)
+                    for i in range(start, min(start + batch, rows))
+                ),
+            )
+
+
+def child(args):
+    sys.path.insert(0, BACKEND)
+    import storage
+
+    store = storage.store
+    prefill(store.pool, args.rows, args.chats)
+
+    start = time.perf_counter()
+    for i in range(args.inserts):
+        store.save_message(f"chat-{i % args.chats}", "user", f"bench {i}")
+    if store.writer is not None:
+        store.writer.flush()
+    insert_rate = args.inserts / (time.perf_counter() - start)
+
+    latencies = []
+    for _ in range(args.reads):
+        chat_id = f"chat-{random.randrange(args.chats)}"
+        t = time.perf_counter()
+        store.get_history(chat_id)
+        latencies.append((time.perf_counter() - t) * 1000)
+    latencies.sort()
+
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(
+        f"{args.mode:<13}{insert_rate:>12,.0f}{statistics.median(latencies):>12.2f}{p95:>12.2f}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--chats", type=int, default=10_000)
+    parser.add_argument("--inserts", type=int, default=20_000)
+    parser.add_argument("--reads", type=int, default=1_000)
+    parser.add_argument("--mode", choices=["direct", "write-behind"])
+    args = parser.parse_args()
+
+    if args.mode:
+        return child(args)
+
+    print(f"{'mode':<13}{'inserts/s':>12}{'read p50 ms':>12}{'read p95 ms':>12}")
+    for mode in ("direct", "write-behind"):
+        with tempfile.TemporaryDirectory() as tmp:
+            env = dict(
+                os.environ,
+                CHAT_DB_PATH=os.path.join(tmp, "bench.db"),
+                CHAT_DB_WRITE_BEHIND="1" if mode == "write-behind" else "0",
+                OPENROUTER_API_KEY=os.getenv("OPENROUTER_API_KEY", "bench"),
+            )
+            subprocess.run(
+                [sys.executable, __file__, "--mode", mode, "--rows", str(args.rows),
+                 "--chats", str(args.chats), "--inserts", str(args.inserts),
+                 "--reads", str(args.reads)],
+                env=env, check=True,
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+# benchmarks/eval_triage.py
+"""
+Offline evaluation of the local triage classifier against logged LLM
+moderator decisions.
+
+Trains on a random split of triage_log and reports, per confidence
+threshold: how often the local model decides (coverage), how often it
+agrees with the LLM when it does, its latency, and the moderator
+latency saved per case.
+
+    python benchmarks/eval_triage.py --test-fraction 0.2
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import triage  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--test-fraction", type=float, default=0.2)
+    parser.add_argument("--thresholds", default="0.6,0.7,0.8,0.9,0.95")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    samples = triage.TriageLog(triage.TRIAGE_LOG_PATH).samples()
+    if len(samples) < 10:
+        print(f"Need at least 10 logged moderator decisions, found {len(samples)}.")
+        return 1
+
+    random.Random(args.seed).shuffle(samples)
+    split = max(1, int(len(samples) * args.test_fraction))
+    test, train = samples[:split], samples[split:]
+
+    model = triage.HashedLinearModel.train([(q, label) for q, label, _ in train])
+
+    latencies = []
+    predictions = []
+    for query, label, _ in test:
+        start = time.perf_counter()
+        predicted, confidence = model.predict(query)
+        latencies.append((time.perf_counter() - start) * 1000)
+        predictions.append((predicted, confidence, label))
+    latencies.sort()
+
+    llm_ms = [ms for _, _, ms in samples if ms]
+    avg_llm_ms = statistics.mean(llm_ms) if llm_ms else 0.0
+
+    print(f"train={len(train)} test={len(test)}")
+    print(f"local latency: p50={statistics.median(latencies):.3f} ms  "
+          f"p99={latencies[int(len(latencies) * 0.99) - 1]:.3f} ms")
+    print(f"LLM moderator: mean={avg_llm_ms:.0f} ms\n")
+    print(f"{'threshold':>9}{'coverage':>10}{'agreement':>11}{'saved/case':>12}")
+    for threshold in (float(t) for t in args.thresholds.split(",")):
+        decided = [(p, y) for p, c, y in predictions if c >= threshold]
+        coverage = len(decided) / len(predictions)
+        agreement = sum(p == y for p, y in decided) / len(decided) if decided else 0.0
+        print(f"{threshold:>9.2f}{coverage:>9.1%}{agreement:>11.1%}{coverage * avg_llm_ms:>9.0f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
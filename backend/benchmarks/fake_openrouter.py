@@ -0,0 +1,248 @@
+# benchmarks/fake_openrouter.py
+"""
+Local OpenAI/OpenRouter-compatible stand-in for load tests.
+
+Serves POST /chat/completions (and /api/v1/chat/completions) with a
+configurable latency distribution, error rate and token streaming, so
+chatbot.call_openrouter and the CrewAI agents can be exercised without
+spending API credits:
+
+    python benchmarks/fake_openrouter.py --port 8765 --latency-ms 800
+    OPENROUTER_BASE_URL=http://127.0.0.1:8765/api/v1 uvicorn api_server:app
+
+Moderator prompts are answered with the tier named by a "tier=HIGH"
+style marker in the case text (default: Moderate).
+
+Like providers with automatic prompt caching, a request whose leading
+messages were all sent before reports their tokens as
+usage.prompt_tokens_details.cached_tokens (whole messages only, unlike
+real providers; --no-prompt-cache turns it off).
+"""
+import argparse
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+TIER_MARKER = re.compile(r"tier=(low|moderate|high)", re.IGNORECASE)
+FILLER = (
+    "Findings are consistent with the presentation. Recommend targeted "
+    "investigations, supportive care and close monitoring. "
+).split()
+
+
+class Settings:
+    latency_dist = "lognormal"
+    latency_ms = 800.0
+    sigma = 0.5
+    error_rate = 0.0
+    error_status = 429
+    completion_tokens = 120
+    token_interval_ms = 5.0
+    prompt_cache = True
+    prompt_cache_entries = 10_000
+
+
+class Stats:
+    lock = threading.Lock()
+    requests = 0
+    prompt_tokens = 0
+    cached_prompt_tokens = 0
+    prefixes = OrderedDict()  # hash of leading messages → None, oldest first
+
+
+def sample_latency() -> float:
+    ms = Settings.latency_ms
+    if Settings.latency_dist == "fixed":
+        return ms / 1000
+    if Settings.latency_dist == "uniform":
+        return random.uniform(0, 2 * ms) / 1000
+    # lognormal with the given median
+    return random.lognormvariate(math.log(ms), Settings.sigma) / 1000
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // 4 + 1
+
+
+def message_text(message: dict) -> str:
+    content = message.get("content") or ""
+    if isinstance(content, list):
+        return "".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return content
+
+
+def cached_tokens(messages) -> int:
+    """Tokens of the longest run of leading messages seen before (Stats.lock held)."""
+    if not Settings.prompt_cache:
+        return 0
+    digest = hashlib.sha1()
+    cached, hit = 0, True
+    for message in messages:
+        digest.update(json.dumps(message, sort_keys=True).encode())
+        key = digest.hexdigest()
+        if hit and key in Stats.prefixes:
+            cached += estimate_tokens(message_text(message))
+            Stats.prefixes.move_to_end(key)
+        else:
+            hit = False
+            Stats.prefixes[key] = None
+    while len(Stats.prefixes) > Settings.prompt_cache_entries:
+        Stats.prefixes.popitem(last=False)
+    return cached
+
+
+def reply_for(messages) -> str:
+    prompt = "\n".join(message_text(m) for m in messages)
+    if "exactly one of these words" in prompt:
+        marker = TIER_MARKER.search(prompt)
+        return marker.group(1).capitalize() if marker else "Moderate"
+    return " ".join(FILLER[i % len(FILLER)] for i in range(Settings.completion_tokens))
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/stats"):
+            with Stats.lock:
+                body = {
+                    "requests": Stats.requests,
+                    "prompt_tokens": Stats.prompt_tokens,
+                    "cached_prompt_tokens": Stats.cached_prompt_tokens,
+                }
+            return self._json(200, body)
+        self._json(404, {"error": "not found"})
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            return self._json(404, {"error": "not found"})
+
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        messages = payload.get("messages", [])
+        prompt_tokens = sum(estimate_tokens(message_text(m)) for m in messages)
+
+        with Stats.lock:
+            Stats.requests += 1
+            Stats.prompt_tokens += prompt_tokens
+            cached = cached_tokens(messages)
+            Stats.cached_prompt_tokens += cached
+
+        time.sleep(sample_latency())
+
+        if random.random() < Settings.error_rate:
+            return self._json(
+                Settings.error_status,
+                {"error": {"message": "fake upstream error", "code": Settings.error_status}},
+            )
+
+        text = reply_for(messages)
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": estimate_tokens(text),
+            "total_tokens": prompt_tokens + estimate_tokens(text),
+            "prompt_tokens_details": {"cached_tokens": cached},
+        }
+        model = payload.get("model", "fake")
+        if payload.get("stream"):
+            return self._stream(model, text, usage)
+
+        self._json(200, {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": text},
+                "finish_reason": "stop",
+            }],
+            "usage": usage,
+        })
+
+    def _stream(self, model: str, text: str, usage: dict):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+
+        chunk_id = f"chatcmpl-{uuid.uuid4().hex}"
+        words = text.split(" ")
+        for i, word in enumerate(words):
+            delta = {"content": word if i == 0 else " " + word}
+            self._event({"id": chunk_id, "model": model,
+                         "choices": [{"index": 0, "delta": delta, "finish_reason": None}]})
+            time.sleep(Settings.token_interval_ms / 1000)
+        self._event({"id": chunk_id, "model": model,
+                     "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+                     "usage": usage})
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+        self.close_connection = True
+
+    def _event(self, data: dict):
+        self.wfile.write(f"data: {json.dumps(data)}\n\n".encode())
+        self.wfile.flush()
+
+    def _json(self, status: int, body: dict):
+        raw = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(raw)))
+        if status == 429:
+            self.send_header("Retry-After", "1")
+        self.end_headers()
+        self.wfile.write(raw)
+
+
+def serve(host: str, port: int) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-dist", choices=["lognormal", "fixed", "uniform"], default="lognormal")
+    parser.add_argument("--latency-ms", type=float, default=800.0, help="median latency per call")
+    parser.add_argument("--sigma", type=float, default=0.5, help="lognormal shape")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=429)
+    parser.add_argument("--completion-tokens", type=int, default=120)
+    parser.add_argument("--token-interval-ms", type=float, default=5.0)
+    parser.add_argument("--no-prompt-cache", action="store_true",
+                        help="never report cached prompt tokens")
+    args = parser.parse_args()
+
+    Settings.latency_dist = args.latency_dist
+    Settings.latency_ms = args.latency_ms
+    Settings.sigma = args.sigma
+    Settings.error_rate = args.error_rate
+    Settings.error_status = args.error_status
+    Settings.completion_tokens = args.completion_tokens
+    Settings.token_interval_ms = args.token_interval_ms
+    Settings.prompt_cache = not args.no_prompt_cache
+
+    server = serve(args.host, args.port)
+    print(f"fake OpenRouter on http://{args.host}:{args.port}/api/v1", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+# benchmarks/loadtest.py
+"""
+Offline load test: latency percentiles and throughput for general chat
+and LOW / MODERATE / HIGH MDAgents pipelines at several concurrency
+levels, against a local OpenRouter stand-in (no API credits spent).
+
+In-process (starts benchmarks/fake_openrouter.py on a free port and calls
+chatbot.general_reply / crew_runner.run_mdagents directly):
+
+    python benchmarks/loadtest.py --concurrency 1,4,16,64 --latency-ms 500
+
+Against a running API server (started with OPENROUTER_BASE_URL pointing
+at a fake_openrouter.py instance):
+
+    python benchmarks/loadtest.py --api http://127.0.0.1:8000
+
+Set MDAGENTS_MODE=chained (or pass --mode) to compare pipeline modes; the
+"ptok/req" column is the upstream prompt tokens per request and "cached"
+the share of them the fake server reported as prompt-cache hits, read
+from its /stats (in-process runs only).
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import uuid
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+SCENARIOS = {
+    "chat": "Explain the difference between TCP and UDP in two paragraphs.",
+    "LOW": "tier=LOW 25-year-old with a sore throat and mild fever for two days.",
+    "MODERATE": (
+        "tier=MODERATE 62-year-old diabetic with fever, a non-healing foot ulcer "
+        "and raised inflammatory markers."
+    ),
+    "HIGH": (
+        "tier=HIGH 54-year-old with fever, jaundice, hypotension and right upper "
+        "quadrant pain; CT shows a dilated common bile duct."
+    ),
+}
+
+
+def percentile(sorted_values, p: float) -> float:
+    if not sorted_values:
+        return float("nan")
+    k = min(len(sorted_values) - 1, max(0, int(round(p / 100 * len(sorted_values))) - 1))
+    return sorted_values[k]
+
+
+def start_fake(args) -> str:
+    import fake_openrouter
+
+    fake_openrouter.Settings.latency_dist = args.latency_dist
+    fake_openrouter.Settings.latency_ms = args.latency_ms
+    fake_openrouter.Settings.error_rate = args.error_rate
+    server = fake_openrouter.serve("127.0.0.1", 0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}/api/v1"
+
+
+def upstream_tokens(base_url: str) -> tuple[int, int]:
+    """(prompt tokens, cached prompt tokens) the fake server has seen so far."""
+    with urllib.request.urlopen(f"{base_url}/stats") as res:
+        stats = json.load(res)
+    return stats["prompt_tokens"], stats["cached_prompt_tokens"]
+
+
+def in_process_callers(args):
+    """Configure the backend for the fake upstream, then import it."""
+    base_url = args.base_url or start_fake(args)
+    tmp = tempfile.mkdtemp(prefix="mdagents-load-")
+    if args.mode:
+        os.environ["MDAGENTS_MODE"] = args.mode
+    os.environ.update({
+        "OPENROUTER_BASE_URL": base_url,
+        "OPENROUTER_API_KEY": os.getenv("OPENROUTER_API_KEY", "loadtest"),
+        "CHAT_DB_PATH": os.path.join(tmp, "chat.db"),
+        "MDAGENTS_CACHE": "0",
+        "TRIAGE_MODEL_PATH": os.path.join(tmp, "no-model.json"),
+        "MDAGENTS_AGENT_SETS": str(max(args.levels)),
+    })
+    import chatbot
+    import crew_runner
+
+    def chat(text):
+        chatbot.general_reply(f"load-{uuid.uuid4()}", text)
+
+    def medical(text):
+        crew_runner.run_mdagents(text, use_cache=False)
+
+    return chat, medical, lambda: upstream_tokens(base_url)
+
+
+def api_callers(args):
+    import httpx
+
+    client = httpx.Client(base_url=args.api, timeout=600,
+                          limits=httpx.Limits(max_connections=max(args.levels)))
+
+    def post(text):
+        res = client.post("/api/chat", json={
+            "chat_id": f"load-{uuid.uuid4()}", "message": text, "no_cache": True,
+        })
+        res.raise_for_status()
+
+    return post, post, None
+
+
+def run_level(call, text: str, concurrency: int, requests: int):
+    latencies, errors = [], 0
+    lock = threading.Lock()
+
+    def one(_):
+        nonlocal errors
+        start = time.perf_counter()
+        try:
+            call(text)
+        except Exception:
+            with lock:
+                errors += 1
+            return
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(requests)))
+    wall = time.perf_counter() - start
+    latencies.sort()
+    return latencies, errors, wall
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--concurrency", default="1,4,16")
+    parser.add_argument("--requests", type=int, default=0,
+                        help="requests per level (default: 4x concurrency, min 8)")
+    parser.add_argument("--scenarios", default="chat,LOW,MODERATE,HIGH")
+    parser.add_argument("--api", help="base URL of a running api_server")
+    parser.add_argument("--base-url", help="existing fake upstream instead of starting one")
+    parser.add_argument("--latency-dist", default="lognormal")
+    parser.add_argument("--latency-ms", type=float, default=500.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--mode", choices=["rounds", "chained"],
+                        help="MDAGENTS_MODE for in-process runs")
+    args = parser.parse_args()
+    args.levels = [int(c) for c in args.concurrency.split(",")]
+
+    chat, medical, tokens = api_callers(args) if args.api else in_process_callers(args)
+
+    print(f"{'scenario':<10}{'conc':>5}{'reqs':>6}{'err':>5}"
+          f"{'p50 s':>8}{'p95 s':>8}{'p99 s':>8}{'req/s':>8}{'ptok/req':>10}{'cached':>8}")
+    for scenario in args.scenarios.split(","):
+        call = chat if scenario == "chat" else medical
+        for concurrency in args.levels:
+            requests = args.requests or max(8, concurrency * 4)
+            before = tokens() if tokens else (0, 0)
+            latencies, errors, wall = run_level(call, SCENARIOS[scenario], concurrency, requests)
+            if tokens:
+                prompt, cached = (now - then for now, then in zip(tokens(), before))
+                per_request = f"{prompt / requests:>10.0f}{cached / max(prompt, 1):>8.0%}"
+            else:
+                per_request = f"{'-':>10}{'-':>8}"
+            print(f"{scenario:<10}{concurrency:>5}{requests:>6}{errors:>5}"
+                  f"{percentile(latencies, 50):>8.2f}{percentile(latencies, 95):>8.2f}"
+                  f"{percentile(latencies, 99):>8.2f}{len(latencies) / wall:>8.1f}{per_request}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+# benchmarks/router_smoke.py
+"""
+Exercise the LiteLLM Router (llm_router.py) against local stand-ins.
+
+Starts two benchmarks/fake_openrouter.py servers as one deployment group,
+optionally making the second one fail every call, sends chat completions
+through chatbot.call_openrouter with LLM_ROUTER=1 and prints how the
+calls were spread:
+
+    python benchmarks/router_smoke.py --requests 40 --fail-second
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import yaml
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_fake(port: int, latency_ms: float, error_rate: float) -> subprocess.Popen:
+    process = subprocess.Popen([
+        sys.executable, os.path.join(HERE, "fake_openrouter.py"),
+        "--port", str(port), "--latency-ms", str(latency_ms),
+        "--error-rate", str(error_rate), "--error-status", "429",
+    ], stdout=subprocess.DEVNULL)
+    for _ in range(50):
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.1).close()
+            return process
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"fake upstream on port {port} did not start")
+
+
+def upstream_requests(port: int) -> int:
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}/api/v1/stats") as res:
+        return json.load(res)["requests"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency-ms", type=float, default=200.0)
+    parser.add_argument("--fail-second", action="store_true",
+                        help="second deployment answers every call with 429")
+    parser.add_argument("--strategy", default="usage-based-routing-v2")
+    args = parser.parse_args()
+
+    ports = [free_port(), free_port()]
+    servers = [
+        start_fake(ports[0], args.latency_ms, 0.0),
+        start_fake(ports[1], args.latency_ms, 1.0 if args.fail_second else 0.0),
+    ]
+    tmp = tempfile.mkdtemp(prefix="mdagents-router-")
+    config = os.path.join(tmp, "config.yaml")
+    with open(config, "w") as f:
+        yaml.safe_dump({
+            "model_list": [
+                {"model_name": "deepseek/deepseek-r1", "litellm_params": {
+                    "model": "openrouter/deepseek/deepseek-r1", "api_key": "fake",
+                    "api_base": f"http://127.0.0.1:{port}/api/v1", "rpm": 600,
+                }}
+                for port in ports
+            ],
+            "router_settings": {
+                "routing_strategy": args.strategy,
+                "num_retries": 2,
+                "allowed_fails": 1,
+                "cooldown_time": 30,
+            },
+        }, f)
+
+    os.environ.update({
+        "LLM_ROUTER": "1",
+        "LLM_ROUTER_CONFIG": config,
+        "OPENROUTER_API_KEY": os.getenv("OPENROUTER_API_KEY", "fake"),
+        "CHAT_DB_PATH": os.path.join(tmp, "chat.db"),
+        "LITELLM_LOCAL_MODEL_COST_MAP": "True",
+    })
+    import chatbot
+
+    def call(_):
+        try:
+            chatbot.call_openrouter([{"role": "user", "content": "ping"}])
+            return True
+        except Exception:
+            return False
+
+    try:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            results = list(pool.map(call, range(args.requests)))
+        wall = time.perf_counter() - start
+
+        print(f"ok {sum(results)}/{len(results)} in {wall:.2f}s")
+        for name, port in zip(("first", "second"), ports):
+            print(f"{name:<8} upstream calls: {upstream_requests(port)}")
+    finally:
+        for server in servers:
+            server.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,99 +1,99 @@
 # chatbot.py
 import os
-import sqlite3
-import json
-import time
-import requests
-from datetime import datetime
+import asyncio
 from dotenv import load_dotenv
+import llm_client
+import llm_router
+import metrics
+import storage
+from context import ConversationContext, CONTEXT_SUMMARY
 
 load_dotenv()
 
 # -----------------------------------
 # OpenRouter API
 # -----------------------------------
-OPENROUTER_URL = "https://openrouter.ai/api/v1/chat/completions"
+# Point at a local stand-in (benchmarks/fake_openrouter.py) for load tests
+OPENROUTER_BASE_URL = os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1").rstrip("/")
+OPENROUTER_URL = f"{OPENROUTER_BASE_URL}/chat/completions"
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
 
 if not OPENROUTER_API_KEY:
     raise ValueError("OPENROUTER_API_KEY missing in .env")
 
 # -----------------------------------
-# SQLite DB Setup
+# Chat store (see storage.py)
 # -----------------------------------
-DB_PATH = os.getenv("CHAT_DB_PATH", "chat_history.db")
+store = storage.store
 
-def init_db():
-    # Auto-create folder if a custom path is used
-    if "/" in DB_PATH:
-        os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
 
-    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
-    cur = conn.cursor()
-
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS messages (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            chat_id TEXT NOT NULL,
-            role TEXT NOT NULL,
-            message TEXT NOT NULL,
-            created_at TEXT NOT NULL
-        );
-    """)
-
-    conn.commit()
-    return conn
-
-db = init_db()
-
-# -----------------------------------
-# Save & Load Chat History
-# -----------------------------------
-def save_message(chat_id: str, role: str, message: str):
-    cur = db.cursor()
-    ts = datetime.utcnow().isoformat() + "Z"
-
-    cur.execute(
-        "INSERT INTO messages (chat_id, role, message, created_at) VALUES (?, ?, ?, ?)",
-        (chat_id, role, message, ts)
-    )
-
-    db.commit()
-
-
-def get_history(chat_id: str):
-    cur = db.cursor()
-    cur.execute(
-        "SELECT role, message, created_at FROM messages WHERE chat_id = ? ORDER BY id ASC",
-        (chat_id,)
-    )
-    return cur.fetchall()
+def delete_history(chat_id: str):
+    # Forget first: a summary fold still running then cannot save afterwards
+    context.forget(chat_id)
+    store.delete_chat(chat_id)
 
 
-def delete_history(chat_id: str):
-    cur = db.cursor()
-    cur.execute("DELETE FROM messages WHERE chat_id = ?", (chat_id,))
-    db.commit()
+def finish_trace(chat_id: str, trace) -> dict:
+    """Close a metrics.Trace and keep it as a row when METRICS_TRACE_ROWS=1."""
+    data = trace.finish()
+    if metrics.TRACE_ROWS:
+        store.save_trace(chat_id, data)
+    return data
 
 
 # -----------------------------------
 # OpenRouter Wrapper
 # -----------------------------------
-def call_openrouter(messages, model="deepseek/deepseek-r1"):
-
-    headers = {
+def openrouter_headers():
+    return {
         "Authorization": f"Bearer {OPENROUTER_API_KEY}",
         "Content-Type": "application/json",
     }
 
+
+def call_openrouter(messages, model="deepseek/deepseek-r1", timeout=None):
+    """Blocking call over the shared keep-alive pool (CLI / worker threads)."""
+    if llm_router.routes(model):
+        return llm_router.completion(messages, model, timeout)
     payload = {
         "model": model,
         "messages": messages
     }
+    return llm_client.post_json(OPENROUTER_URL, payload, openrouter_headers(), timeout)
 
-    response = requests.post(OPENROUTER_URL, json=payload, headers=headers, timeout=30)
-    response.raise_for_status()
-    return response.json()
+
+async def acall_openrouter(messages, model="deepseek/deepseek-r1", timeout=None):
+    """Non-blocking call for the API server's event loop."""
+    if await llm_router.aroutes(model):
+        return await llm_router.acompletion(messages, model, timeout)
+    payload = {
+        "model": model,
+        "messages": messages
+    }
+    return await llm_client.apost_json(OPENROUTER_URL, payload, openrouter_headers(), timeout)
+
+
+async def astream_openrouter(messages, model="deepseek/deepseek-r1", timeout=None, usage=None):
+    """
+    Yield reply tokens as OpenRouter streams them. Pass a dict as `usage`
+    to receive the token counts sent with the final chunk.
+    """
+    if await llm_router.aroutes(model):
+        chunks = llm_router.astream(messages, model, timeout)
+    else:
+        payload = {
+            "model": model,
+            "messages": messages,
+            "stream": True,
+        }
+        chunks = llm_client.astream_sse(OPENROUTER_URL, payload, openrouter_headers(), timeout)
+    async for chunk in chunks:
+        if usage is not None and chunk.get("usage"):
+            usage.update(chunk["usage"])
+        choices = chunk.get("choices") or [{}]
+        token = (choices[0].get("delta") or {}).get("content")
+        if token:
+            yield token
 
 
 # -----------------------------------
@@ -104,32 +104,116 @@ SYSTEM_PROMPT = (
     "Always answer clearly, concisely, and in well-structured language."
 )
 
-def build_conversation(chat_id: str):
-    history = get_history(chat_id)
+SUMMARY_PROMPT = (
+    "Update the running summary of a conversation with the new turns below. "
+    "Keep facts, names, decisions and open questions. Reply with the summary only."
+)
+
+def summarize_turns(previous_summary: str, turns):
+    transcript = "\n".join(f"{role}: {text}" for role, text in turns)
+    res = call_openrouter([
+        {"role": "system", "content": SUMMARY_PROMPT},
+        {"role": "user", "content": f"Current summary:\n{previous_summary or '(none)'}\n\nNew turns:\n{transcript}"},
+    ])
+    return res["choices"][0]["message"]["content"].strip()
+
+
+context = ConversationContext(
+    SYSTEM_PROMPT,
+    load_history=lambda chat_id: [(role, text) for role, text, ts in store.get_history(chat_id)],
+    message_count=store.message_count,
+    load_summary=store.load_summary if CONTEXT_SUMMARY else None,
+    save_summary=store.save_summary if CONTEXT_SUMMARY else None,
+    summarize=summarize_turns if CONTEXT_SUMMARY else None,
+)
+
 
-    convo = [{"role": "system", "content": SYSTEM_PROMPT}]
+def build_conversation(chat_id: str):
+    """Token-budgeted prompt for a chat whose latest user turn is already saved."""
+    return context.build(chat_id)
 
-    for role, text, ts in history:
-        convo.append({"role": role, "content": text})
 
-    return convo
+def record_turn(chat_id: str, role: str, text: str):
+    store.save_message(chat_id, role, text)
+    context.append(chat_id, role, text)
 
 
 def general_reply(chat_id: str, user_message: str):
 
-    # Save user's message
-    save_message(chat_id, "user", user_message)
+    # Save user's message (it is then part of the conversation)
+    record_turn(chat_id, "user", user_message)
 
     convo = build_conversation(chat_id)
-    convo.append({"role": "user", "content": user_message})
 
+    trace = metrics.Trace("chat")
     try:
-        res = call_openrouter(convo)
+        with metrics.stage("completion", trace, path="chat") as stage:
+            res = call_openrouter(convo)
+            stage.add_usage(res.get("usage"))
         reply = res["choices"][0]["message"]["content"]
     except Exception as e:
         reply = f"Error contacting OpenRouter: {e}"
 
     # Save assistant reply
-    save_message(chat_id, "assistant", reply)
+    record_turn(chat_id, "assistant", reply)
+    finish_trace(chat_id, trace)
+
+    return reply
+
+
+async def general_reply_async(chat_id: str, user_message: str):
+    """
+    Same as general_reply, but awaits the LLM instead of holding a thread.
+    The SQLite write and history read run in a thread, off the event loop.
+    """
+
+    await asyncio.to_thread(record_turn, chat_id, "user", user_message)
+
+    convo = await asyncio.to_thread(build_conversation, chat_id)
+
+    trace = metrics.Trace("chat")
+    try:
+        with metrics.stage("completion", trace, path="chat") as stage:
+            res = await acall_openrouter(convo)
+            stage.add_usage(res.get("usage"))
+        reply = res["choices"][0]["message"]["content"]
+    except Exception as e:
+        reply = f"Error contacting OpenRouter: {e}"
+
+    await asyncio.to_thread(record_turn, chat_id, "assistant", reply)
+    await asyncio.to_thread(finish_trace, chat_id, trace)
 
     return reply
+
+
+async def stream_general_reply(chat_id: str, user_message: str):
+    """
+    Streaming variant of general_reply: yields tokens as they arrive and
+    saves the assembled reply once the stream ends (or is cut short).
+    Saving and history reads run in a thread, off the event loop.
+    """
+
+    await asyncio.to_thread(record_turn, chat_id, "user", user_message)
+
+    convo = await asyncio.to_thread(build_conversation, chat_id)
+
+    parts = []
+    usage = {}
+    trace = metrics.Trace("chat_stream")
+    try:
+        with metrics.stage("completion", trace, path="chat_stream") as stage:
+            async for token in astream_openrouter(convo, usage=usage):
+                parts.append(token)
+                yield token
+            stage.add_usage(usage)
+    except Exception as e:
+        error = f"Error contacting OpenRouter: {e}"
+        parts.append(error)
+        yield error
+    finally:
+        # One shielded await: a client disconnect (even a second cancel)
+        # cancels the stream, not either save
+        await asyncio.shield(asyncio.gather(
+            asyncio.to_thread(record_turn, chat_id, "assistant", "".join(parts)),
+            asyncio.to_thread(finish_trace, chat_id, trace),
+        ))
@@ -0,0 +1,166 @@
+# context.py
+import os
+import time
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+# -----------------------------------
+# Settings
+# -----------------------------------
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CHAT_CONTEXT_TOKENS", "6000"))
+CONTEXT_CACHE_CHATS = int(os.getenv("CHAT_CONTEXT_CACHE_CHATS", "1000"))
+CONTEXT_SUMMARY = os.getenv("CHAT_CONTEXT_SUMMARY", "0") == "1"
+# How long a cached window is trusted before its message count is checked
+# against the store again (writes by other processes show up after this)
+CONTEXT_RECHECK_SECONDS = float(os.getenv("CHAT_CONTEXT_RECHECK_SECONDS", "2"))
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 chars per token plus per-message overhead)."""
+    return len(text) // 4 + 4
+
+
+class ChatWindow:
+    """Cached tail of one conversation, plus the rolling summary of older turns."""
+
+    def __init__(self, turns, seen: int, summary: str = "", summarized: int = 0):
+        self.turns = deque()   # (role, text, tokens)
+        self.tokens = 0
+        self.seen = seen              # messages of this chat accounted for
+        self.summary = summary
+        self.summarized = summarized  # oldest messages folded into summary
+        self.evicted = []             # dropped turns waiting to be summarized
+        self.checked = time.monotonic()  # last message_count check
+        for role, text in turns:
+            self.append(role, text)
+
+    def append(self, role: str, text: str):
+        tokens = estimate_tokens(text)
+        self.turns.append((role, text, tokens))
+        self.tokens += tokens
+
+    def trim(self, budget: int):
+        # Always keep the latest turn, even if it alone is over budget
+        while self.tokens > budget and len(self.turns) > 1:
+            role, text, tokens = self.turns.popleft()
+            self.tokens -= tokens
+            self.evicted.append((role, text))
+
+
+class ConversationContext:
+    """
+    Per-chat conversation window kept in memory (LRU over chats).
+
+    The store is only read on a cache miss or when another process has
+    written to the chat (its message count moved ahead of ours, checked
+    at most every `recheck_seconds`); otherwise new turns are appended in
+    place. The window is trimmed to
+    `token_budget`, oldest turns first. With a summarizer, dropped turns
+    are folded into a rolling summary in the background and persisted.
+
+    Storage is injected:
+        load_history(chat_id)   -> [(role, text), ...] oldest first
+        message_count(chat_id)  -> int
+        load_summary(chat_id)   -> (summary, summarized_count) or None
+        save_summary(chat_id, summary, summarized_count)
+        summarize(previous_summary, [(role, text), ...]) -> str
+    """
+
+    def __init__(self, system_prompt: str, load_history, message_count,
+                 token_budget: int = CONTEXT_TOKEN_BUDGET,
+                 max_chats: int = CONTEXT_CACHE_CHATS,
+                 load_summary=None, save_summary=None, summarize=None,
+                 recheck_seconds: float = CONTEXT_RECHECK_SECONDS):
+        self.system_prompt = system_prompt
+        self.load_history = load_history
+        self.message_count = message_count
+        self.token_budget = token_budget
+        self.max_chats = max_chats
+        self.load_summary = load_summary
+        self.save_summary = save_summary
+        self.summarize = summarize
+        self.recheck_seconds = recheck_seconds
+        self._chats: OrderedDict[str, ChatWindow] = OrderedDict()
+        self._lock = threading.Lock()
+        # Bumped by forget; a background fold started before that must not
+        # save a summary for the deleted chat. Checked and saved under
+        # _save_lock, which forget also takes.
+        self._generations: dict[str, int] = {}
+        self._save_lock = threading.Lock()
+        self._summarizer = (
+            ThreadPoolExecutor(max_workers=1, thread_name_prefix="chat-summary")
+            if summarize else None
+        )
+
+    # ---------- cache ----------
+    def _load(self, chat_id: str) -> ChatWindow:
+        history = self.load_history(chat_id)
+        summary, summarized = "", 0
+        if self.load_summary:
+            summary, summarized = self.load_summary(chat_id) or ("", 0)
+        return ChatWindow(history[summarized:], len(history), summary, summarized)
+
+    def _window(self, chat_id: str) -> ChatWindow:
+        with self._lock:
+            window = self._chats.get(chat_id)
+        if window is None:
+            window = self._load(chat_id)
+        elif time.monotonic() - window.checked > self.recheck_seconds:
+            if self.message_count(chat_id) > window.seen:
+                window = self._load(chat_id)
+            else:
+                window.checked = time.monotonic()
+        with self._lock:
+            self._chats[chat_id] = window
+            self._chats.move_to_end(chat_id)
+            while len(self._chats) > self.max_chats:
+                self._chats.popitem(last=False)
+        return window
+
+    def append(self, chat_id: str, role: str, text: str):
+        """Record a turn that was just saved. No-op if the chat is not cached."""
+        with self._lock:
+            window = self._chats.get(chat_id)
+            if window is not None:
+                window.append(role, text)
+                window.seen += 1
+
+    def forget(self, chat_id: str):
+        """Drop the chat; call before deleting it so no pending summary is saved after."""
+        with self._save_lock, self._lock:
+            self._chats.pop(chat_id, None)
+            self._generations[chat_id] = self._generations.get(chat_id, 0) + 1
+
+    # ---------- prompt ----------
+    def build(self, chat_id: str) -> list[dict]:
+        """System prompt (+ summary) followed by the newest turns within budget."""
+        window = self._window(chat_id)
+
+        with self._lock:
+            system = self.system_prompt
+            if window.summary:
+                system += "\n\nSummary of the earlier conversation:\n" + window.summary
+            window.trim(self.token_budget - estimate_tokens(system))
+            convo = [{"role": "system", "content": system}]
+            convo.extend({"role": role, "content": text} for role, text, _ in window.turns)
+
+            evicted, window.evicted = window.evicted, []
+
+        if evicted and self._summarizer is not None:
+            with self._lock:
+                generation = self._generations.get(chat_id, 0)
+            self._summarizer.submit(self._fold, chat_id, window, evicted, generation)
+        return convo
+
+    def _fold(self, chat_id: str, window: ChatWindow, evicted, generation: int):
+        summary = self.summarize(window.summary, evicted)
+        with self._lock:
+            window.summary = summary
+            window.summarized += len(evicted)
+            summarized = window.summarized
+        if self.save_summary:
+            with self._save_lock:
+                if self._generations.get(chat_id, 0) != generation:
+                    return  # forgotten (deleted) meanwhile
+                self.save_summary(chat_id, summary, summarized)
@@ -1,7 +1,54 @@
 # crew_runner.py
-from crewai import Crew
-from agents import create_agents
-from tasks import create_tasks
+import os
+import time
+import queue
+import threading
+import contextvars
+from contextlib import contextmanager, nullcontext
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from tasks import create_tasks, chain_task, bound_case, TEMPLATE_VERSION
+import metrics
+import model_policy
+import result_cache
+import singleflight
+import triage
+
+# crewai (and litellm behind it) takes seconds to import, so it and
+# agents.py are only imported when a pipeline is actually built or run;
+# importing this module stays cheap (see benchmarks/bench_import.py).
+
+# Max specialist rounds kicked off at once (1 = run them one after another)
+ROUND_CONCURRENCY = int(os.getenv("MDAGENTS_ROUND_CONCURRENCY", "4"))
+# Agent sets kept by the pipeline (≈ max concurrent run_mdagents calls)
+AGENT_SETS = int(os.getenv("MDAGENTS_AGENT_SETS", "4"))
+# Max batch cases in flight at once, shared by every run_batch call
+BATCH_CONCURRENCY = int(os.getenv("MDAGENTS_BATCH_CONCURRENCY", "4"))
+# Specialists always answer independently (optionally in parallel).
+# "rounds": the integrator works from its own prompt. "chained": it also
+# sees a token-bounded digest of the specialists' findings, and a LOW
+# case ends with the primary care answer. Chained saves a call and ~40%
+# of prompt tokens on LOW cases but costs the digest on MODERATE/HIGH
+# ones (benchmarks/bench_chained.py): pick it for the integrated review,
+# not to save tokens overall.
+PIPELINE_MODE = os.getenv("MDAGENTS_MODE", "rounds")
+# Token budget of that digest (~4 characters per token)
+DIGEST_TOKENS = int(os.getenv("MDAGENTS_DIGEST_TOKENS", "120"))
+# Cached results are only reused for the same prompts, model and mode
+PIPELINE_VERSION = f"{TEMPLATE_VERSION}:{model_policy.DEFAULT_MODEL}:{PIPELINE_MODE}"
+# Build the pipeline in the background once the API server is up,
+# instead of on the first medical request
+PREWARM = os.getenv("MDAGENTS_PREWARM", "0") == "1"
+# Specialist rounds per complexity tier (tasks[1:1 + n])
+TIER_ROUNDS = {"LOW": 1, "MODERATE": 3, "HIGH": 4}
+
+
+def parallel_calls(tier: str | None, concurrency: int | None = None) -> int:
+    """
+    Most LLM calls one run can have in flight at once, for the scheduler.
+    An unknown tier counts as HIGH; only parallel rounds exceed one call.
+    """
+    rounds = TIER_ROUNDS.get(tier, TIER_ROUNDS["HIGH"])
+    return max(1, min(ROUND_CONCURRENCY if concurrency is None else concurrency, rounds))
 
 
 def extract_output(result) -> str:
@@ -28,59 +75,378 @@ def extract_output(result) -> str:
     return str(result).strip()
 
 
-def run_mdagents(query: str) -> dict:
+def summarize_round(result_str: str) -> str:
+    """Keep the first two sentences of a round's output."""
+    parts = [p.strip() for p in result_str.split(".") if p.strip()]
+    return ". ".join(parts[:2])
+
+
+def kickoff(crew, name: str, trace=None) -> str:
+    """Run a crew as one timed metrics stage and return its text output."""
+    from agents import recording_usage
+
+    model = getattr(crew.tasks[0].agent.llm, "model", "")
+    with metrics.stage(name, trace, model=model) as stage, recording_usage(stage):
+        result = crew.kickoff()
+    return extract_output(result)
+
+
+def run_round(task, trace=None) -> str:
     """
-    Core MDAgents-style pipeline, mapped to your code:
+    Run a single reasoning round.
+    Only the task's own agent joins the crew, so rounds running in
+    parallel never share an Agent instance.
     """
+    from crewai import Crew
 
-    agents = create_agents()
-    tasks = create_tasks(query, agents)
-
-    # STEP 1 — Complexity classification
-    comp_crew = Crew(
-        agents=[agents["moderator"]],
-        tasks=[tasks[0]],
+    crew_team = Crew(
+        agents=[task.agent],
+        tasks=[task],
         verbose=False,
     )
-    complexity_raw = extract_output(comp_crew.kickoff())
-    complexity = (complexity_raw or "UNKNOWN").upper()
-
-    if "LOW" in complexity:
-        level = "LOW"
-        active_tasks = [tasks[1]]
-    elif "MODERATE" in complexity:
-        level = "MODERATE"
-        active_tasks = [tasks[1], tasks[2], tasks[3]]
-    else:
-        level = "HIGH"
-        active_tasks = [tasks[1], tasks[2], tasks[3], tasks[4]]
-
-    # STEP 2 — Reasoning rounds
-    reasoning_summaries: list[str] = []
-
-    for task in active_tasks:
-        crew_team = Crew(
-            agents=list(agents.values()),
-            tasks=[task],
+    return kickoff(crew_team, task.name, trace)
+
+
+def run_rounds(active_tasks, concurrency: int, emit=None, trace=None) -> list[str]:
+    """
+    Fan the independent reasoning rounds out over a bounded thread pool.
+    Results come back in the same order as `active_tasks`; `emit` fires
+    as each round finishes. Each round runs in a copy of the caller's
+    context, so it sees the case bound by MDAgentsPipeline.run.
+    """
+    def run_and_report(task):
+        output = run_round(task, trace)
+        if emit:
+            emit_round(emit, task, output)
+        return output
+
+    workers = max(1, min(concurrency, len(active_tasks)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="mdagents-round") as pool:
+        futures = [
+            pool.submit(contextvars.copy_context().run, run_and_report, task)
+            for task in active_tasks
+        ]
+        return [future.result() for future in futures]
+
+
+def apply_policy(agents: dict, tier: str = ""):
+    """Point each agent at the LLM model_policy picks for its role and tier."""
+    from agents import llm_for
+
+    for role, agent in agents.items():
+        agent.llm = llm_for(model_policy.policy.settings(role, tier))
+
+
+def emit_round(emit, task, output: str):
+    emit("round", {"role": task.agent.role, "summary": summarize_round(output)})
+
+
+def build_digest(findings, max_tokens: int | None = None) -> str:
+    """
+    One "- Role: summary" line per earlier stage, each clipped to an equal
+    share of the token budget (default DIGEST_TOKENS).
+    """
+    if not findings:
+        return ""
+    if max_tokens is None:
+        max_tokens = DIGEST_TOKENS
+    share = max(8, 4 * max_tokens // len(findings))
+    lines = []
+    for role, summary in findings:
+        line = f"- {role}: {summary}"
+        if len(line) > share:
+            line = line[:share - 1].rstrip() + "…"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+class MDAgentsPipeline:
+    """
+    Long-lived MDAgents pipeline.
+
+    Agents are built once and reused; per request only the tasks are bound
+    to the case text (prompt templates are precompiled in tasks.py).
+    CrewAI agents carry per-run state, so every in-flight request checks
+    out its own agent set and concurrent requests never share an Agent.
+    """
+
+    def __init__(self, pool_size: int = AGENT_SETS, triage_stage=None,
+                 mode: str = PIPELINE_MODE):
+        self.pool_size = max(1, pool_size)
+        self.mode = mode
+        # Optional local classifier tried before the LLM moderator:
+        # decide(query) -> level | None, record(query, level, llm_ms)
+        self.triage = triage_stage
+        self._agent_sets: queue.LifoQueue = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+
+    def warm(self, count: int = 1):
+        """Build agent sets ahead of the first request."""
+        from agents import create_agents
+
+        for _ in range(count):
+            with self._lock:
+                if self._created >= self.pool_size:
+                    return
+                self._created += 1
+            self._agent_sets.put(create_agents())
+
+    @contextmanager
+    def checkout(self):
+        from agents import create_agents
+
+        try:
+            agents = self._agent_sets.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                build = self._created < self.pool_size
+                if build:
+                    self._created += 1
+            agents = create_agents() if build else self._agent_sets.get()
+        try:
+            yield agents
+        finally:
+            self._agent_sets.put(agents)
+
+    def run(self, query: str, concurrency: int | None = None, on_event=None,
+            trace=None) -> dict:
+        """
+        Core MDAgents-style pipeline, mapped to your code:
+
+        concurrency: max specialist rounds in flight at once.
+                     Defaults to MDAGENTS_ROUND_CONCURRENCY; 1 keeps the
+                     original sequential behaviour.
+        on_event:    optional callback(kind, data) for progress updates:
+                     "complexity" once triage is done, then "round" as
+                     each specialist finishes. May be called from worker
+                     threads.
+        trace:       optional metrics.Trace collecting per-stage timings.
+        """
+        if concurrency is None:
+            concurrency = ROUND_CONCURRENCY
+
+        with self.checkout() as agents, bound_case(query):
+            return self._run(query, agents, concurrency, on_event, trace)
+
+    def _run(self, query: str, agents: dict, concurrency: int, emit=None,
+             trace=None) -> dict:
+        from crewai import Crew
+
+        tasks = create_tasks(agents)
+        apply_policy(agents)
+
+        # STEP 1 — Complexity classification (local fast path, else LLM moderator)
+        complexity = None
+        if self.triage:
+            with metrics.stage("local_triage", trace):
+                complexity = self.triage.decide(query)
+
+        if complexity is None:
+            started = time.perf_counter()
+            comp_crew = Crew(
+                agents=[agents["moderator"]],
+                tasks=[tasks[0]],
+                verbose=False,
+            )
+            complexity_raw = kickoff(comp_crew, tasks[0].name, trace)
+            complexity = (complexity_raw or "UNKNOWN").upper()
+
+            if self.triage:
+                llm_ms = (time.perf_counter() - started) * 1000
+                label = next((l for l in triage.LABELS if l in complexity), None)
+                if label:
+                    self.triage.record(query, label, llm_ms)
+
+        if "LOW" in complexity:
+            level = "LOW"
+        elif "MODERATE" in complexity:
+            level = "MODERATE"
+        else:
+            level = "HIGH"
+        active_tasks = tasks[1:1 + TIER_ROUNDS[level]]
+
+        apply_policy(agents, level)
+        if trace is not None:
+            trace.tier = level
+        if emit:
+            emit("complexity", {"complexity": level})
+
+        # STEP 2 — Reasoning rounds (independent of each other)
+        reasoning_summaries: list[str] = []
+
+        if concurrency > 1 and len(active_tasks) > 1:
+            round_outputs = run_rounds(active_tasks, concurrency, emit, trace)
+        else:
+            round_outputs = []
+            for task in active_tasks:
+                round_outputs.append(run_round(task, trace))
+                if emit:
+                    emit_round(emit, task, round_outputs[-1])
+
+        for result_str in round_outputs:
+            short_reason = summarize_round(result_str)
+            if short_reason:
+                reasoning_summaries.append(short_reason)
+
+        if self.mode == "chained":
+            return self._finish_chained(tasks[-1], active_tasks, round_outputs, level, trace)
+
+        # STEP 3 — Final integration
+        final_crew = Crew(
+            agents=[agents["infectious"]],
+            tasks=[tasks[-1]],
             verbose=False,
         )
-        result_str = extract_output(crew_team.kickoff())
+        final_answer = kickoff(final_crew, tasks[-1].name, trace)
 
-        parts = [p.strip() for p in result_str.split(".") if p.strip()]
-        short_reason = ". ".join(parts[:2])
-        if short_reason:
-            reasoning_summaries.append(short_reason)
+        return {
+            "final": final_answer,
+            "reasoning": reasoning_summaries,
+            "complexity": level,
+        }
 
-    # STEP 3 — Final integration
-    final_crew = Crew(
-        agents=[agents["infectious"]],
-        tasks=[tasks[-1]],
-        verbose=False,
+    def _finish_chained(self, final_task, active_tasks, round_outputs, level: str,
+                        trace=None) -> dict:
+        """
+        The final review gets a digest of the specialists' findings; a LOW
+        case ends with the primary care answer instead.
+        """
+        findings = [
+            (task.agent.role, summarize_round(output))
+            for task, output in zip(active_tasks, round_outputs)
+        ]
+        if level == "LOW":
+            final_answer = round_outputs[-1]
+        else:
+            final_answer = run_round(chain_task(final_task, build_digest(findings)), trace)
+
+        return {
+            "final": final_answer,
+            "reasoning": [summary for _, summary in findings if summary],
+            "complexity": level,
+        }
+
+
+_pipeline: MDAgentsPipeline | None = None
+_pipeline_lock = threading.Lock()
+
+
+def get_pipeline() -> MDAgentsPipeline:
+    global _pipeline
+    if _pipeline is None:
+        with _pipeline_lock:
+            if _pipeline is None:
+                _pipeline = MDAgentsPipeline(triage_stage=triage.load_default())
+    return _pipeline
+
+
+def prewarm() -> threading.Thread:
+    """Import crewai and build the first agent set on a background thread."""
+    thread = threading.Thread(
+        target=lambda: get_pipeline().warm(), name="mdagents-prewarm", daemon=True
+    )
+    thread.start()
+    return thread
+
+
+def run_mdagents(query: str, concurrency: int | None = None, on_event=None,
+                 use_cache: bool = True, on_join=None) -> dict:
+    """
+    Run the pipeline, answering from the result cache when the same
+    (normalized) case was already seen, and joining the in-flight run
+    when an identical case is being processed right now (on_join() is
+    called first, e.g. to give back a scheduler ticket).
+    use_cache=False forces a fresh, private run.
+
+    The returned dict carries a "trace" entry with per-stage timings and
+    token counts (see metrics.Trace.finish).
+    """
+    if not use_cache:
+        return run_fresh(query, concurrency, on_event)
+
+    key = flight_key(query)
+    cache = result_cache.cache
+    if cache is not None:
+        cached = cache.get(key)
+        if cached is not None:
+            if on_event:
+                on_event("complexity", {"complexity": cached["complexity"], "cached": True})
+            trace = metrics.Trace("mdagents_cached")
+            trace.tier = cached["complexity"]
+            return {**cached, "trace": trace.finish()}
+
+    return _flights.do(
+        key, lambda emit: run_fresh(query, concurrency, emit, cache, key), on_event, on_join
     )
-    final_answer = extract_output(final_crew.kickoff())
 
-    return {
-        "final": final_answer,
-        "reasoning": reasoning_summaries,
-        "complexity": level,
-    }
+
+def flight_key(query: str) -> str:
+    version = f"{PIPELINE_VERSION}:{model_policy.policy.current_version()}"
+    return result_cache.cache_key(query, version)
+
+
+def join_inflight(query: str, on_event=None):
+    """
+    The Future of an identical run already in flight, or None. Lets an
+    async caller wait on it without a scheduler ticket or a worker thread.
+    """
+    return _flights.join(flight_key(query), on_event)
+
+
+def run_fresh(query: str, concurrency: int | None = None, on_event=None,
+              cache=None, key: str | None = None) -> dict:
+    trace = metrics.Trace("mdagents")
+    result = get_pipeline().run(query, concurrency, on_event, trace)
+
+    if cache is not None:
+        cache.put(key, result)
+    return {**result, "trace": trace.finish()}
+
+
+# Identical cases in flight at the same time share one pipeline run
+_flights = singleflight.SingleFlight(on_join=metrics.COALESCED.inc)
+
+
+_batch_slots = threading.BoundedSemaphore(BATCH_CONCURRENCY)
+
+
+def run_batch(queries, use_cache: bool = True, indices=None, admit=None):
+    """
+    Run many cases through run_mdagents and yield one dict per case in
+    completion order:
+
+        {"index": i, "ok": True,  "result": {...}}
+        {"index": i, "ok": False, "error": "..."}
+
+    At most BATCH_CONCURRENCY cases run at once across all concurrent
+    batches. A failing case is reported and the batch carries on.
+    `indices` overrides the reported index of each query. `admit(query)`,
+    when given, returns a context manager held while the case runs (the
+    API server's scheduler.hold).
+    """
+    queries = list(queries)
+    indices = list(indices) if indices is not None else list(range(len(queries)))
+
+    def run_one(index: int, query: str) -> dict:
+        with _batch_slots:
+            try:
+                if not query or not query.strip():
+                    raise ValueError("Case text is empty.")
+                with admit(query.strip()) if admit else nullcontext():
+                    result = run_mdagents(query.strip(), use_cache=use_cache)
+                return {"index": index, "ok": True, "result": result}
+            except Exception as e:
+                return {"index": index, "ok": False, "error": f"{type(e).__name__}: {e}"}
+
+    pool = ThreadPoolExecutor(
+        max_workers=max(1, min(BATCH_CONCURRENCY, len(queries))),
+        thread_name_prefix="mdagents-batch",
+    )
+    try:
+        futures = [pool.submit(run_one, i, q) for i, q in zip(indices, queries)]
+        for future in as_completed(futures):
+            yield future.result()
+    finally:
+        # Stop queued cases if the consumer goes away (e.g. client disconnect)
+        pool.shutdown(wait=False, cancel_futures=True)
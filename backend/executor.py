@@ -0,0 +1,93 @@
+# executor.py
+import os
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# -----------------------------------
+# Settings
+# -----------------------------------
+WORKER_THREADS = int(os.getenv("WORKER_THREADS", "4"))
+WORKER_QUEUE_SIZE = int(os.getenv("WORKER_QUEUE_SIZE", "16"))
+WORKER_RETRY_AFTER = int(os.getenv("WORKER_RETRY_AFTER", "10"))
+
+
+class QueueFull(Exception):
+    """Raised when the admission queue cannot take another job."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Worker queue is full, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+# -----------------------------------
+# Bounded worker pool
+# -----------------------------------
+class WorkerPool:
+    """
+    Runs blocking work (MDAgents pipeline, sync LLM calls) off the event loop.
+
+    At most `max_workers` jobs run at once and at most `max_queue` more
+    wait for a free worker. Anything beyond that is rejected with QueueFull
+    instead of piling up behind the loop.
+    """
+
+    def __init__(self, max_workers: int, max_queue: int, retry_after: int):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.retry_after = retry_after
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="llm-worker"
+        )
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._active = 0
+
+    def submit(self, fn, *args, **kwargs):
+        with self._lock:
+            if self._queued + self._active >= self.max_workers + self.max_queue:
+                raise QueueFull(self.retry_after)
+            self._queued += 1
+
+        def job():
+            with self._lock:
+                self._queued -= 1
+                self._active += 1
+            return fn(*args, **kwargs)
+
+        try:
+            future = self._executor.submit(job)
+        except BaseException:
+            with self._lock:
+                self._queued -= 1
+            raise
+        # Also runs for a future cancelled before it started (awaiting task
+        # cancelled, shutdown), which never reached job()
+        future.add_done_callback(self._finished)
+        return future
+
+    def _finished(self, future):
+        with self._lock:
+            if future.cancelled():
+                self._queued -= 1
+            else:
+                self._active -= 1
+
+    async def run(self, fn, *args, **kwargs):
+        """Submit `fn` and await its result without blocking the event loop."""
+        return await asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "queue_depth": self._queued,
+                "active_workers": self._active,
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+            }
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+
+pool = WorkerPool(WORKER_THREADS, WORKER_QUEUE_SIZE, WORKER_RETRY_AFTER)
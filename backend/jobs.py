@@ -0,0 +1,268 @@
+# jobs.py
+"""
+Persistent job queue for asynchronous medical cases.
+
+POST /api/cases stores a row in the `jobs` table and returns at once;
+worker processes claim rows with a lease, run the MDAgents pipeline and
+write progress into the row as each stage finishes. While a job runs its
+worker renews the lease (heartbeat); if the process dies the lease
+expires and another worker picks the job up again. Result writes are
+conditional on still holding the lease, so a job is never completed twice.
+
+Workers start with the API server (CASE_WORKERS, default 1; set it to 0
+only when workers run elsewhere), or standalone:
+
+    python jobs.py work            # CASE_WORKERS processes (min 1)
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import socket
+import sqlite3
+import threading
+import traceback
+import multiprocessing
+import storage
+
+# -----------------------------------
+# Settings
+# -----------------------------------
+JOBS_DB_PATH = os.getenv("JOBS_DB_PATH", os.getenv("CHAT_DB_PATH", "chat_history.db"))
+# Worker processes started by the API server (0 = run them elsewhere)
+CASE_WORKERS = int(os.getenv("CASE_WORKERS", "1"))
+CASE_LEASE_SECONDS = float(os.getenv("CASE_LEASE_SECONDS", "120"))
+CASE_HEARTBEAT_SECONDS = float(os.getenv("CASE_HEARTBEAT_SECONDS", "20"))
+CASE_POLL_SECONDS = float(os.getenv("CASE_POLL_SECONDS", "1"))
+# A job whose worker died this many times is marked failed
+CASE_MAX_ATTEMPTS = int(os.getenv("CASE_MAX_ATTEMPTS", "3"))
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+
+# -----------------------------------
+# Job table
+# -----------------------------------
+class JobStore:
+    """
+    Each process opens its own JobStore. Claims run in a BEGIN IMMEDIATE
+    transaction, so two workers can never take the same row. The table
+    itself comes from storage.MIGRATIONS.
+    """
+
+    def __init__(self, path: str, lease_seconds: float = CASE_LEASE_SECONDS,
+                 max_attempts: int = CASE_MAX_ATTEMPTS):
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30,
+                                     isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        storage.migrate(self._conn)
+
+    def enqueue(self, query: str, use_cache: bool = True) -> str:
+        job_id = str(uuid.uuid4())
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, query, use_cache, status, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, query, int(use_cache), QUEUED, now, now)
+            )
+        return job_id
+
+    def get(self, job_id: str) -> dict | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, status, attempts, stages, result, error, created_at, updated_at "
+                "FROM jobs WHERE id = ?",
+                (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            "id": row[0],
+            "status": row[1],
+            "attempts": row[2],
+            "stages": json.loads(row[3]),
+            "result": json.loads(row[4]) if row[4] else None,
+            "error": row[5],
+            "created_at": row[6],
+            "updated_at": row[7],
+        }
+
+    def claim(self, owner: str):
+        """
+        Take the oldest queued job, or a running one whose lease expired
+        (its worker died). Returns (id, query, use_cache) or None.
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Jobs whose workers kept dying are given up on
+                self._conn.execute(
+                    "UPDATE jobs SET status = ?, error = ?, lease_owner = NULL, updated_at = ? "
+                    "WHERE status = ? AND lease_expires < ? AND attempts >= ?",
+                    (FAILED, "Worker lost too many times.", now, RUNNING, now, self.max_attempts)
+                )
+                row = self._conn.execute(
+                    """
+                    SELECT id, query, use_cache FROM jobs
+                     WHERE status = ? OR (status = ? AND lease_expires < ?)
+                     ORDER BY created_at LIMIT 1
+                    """,
+                    (QUEUED, RUNNING, now)
+                ).fetchone()
+                if row is not None:
+                    self._conn.execute(
+                        "UPDATE jobs SET status = ?, attempts = attempts + 1, stages = '[]', "
+                        "lease_owner = ?, lease_expires = ?, updated_at = ? WHERE id = ?",
+                        (RUNNING, owner, now + self.lease_seconds, now, row[0])
+                    )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return (row[0], row[1], bool(row[2])) if row else None
+
+    def heartbeat(self, job_id: str, owner: str) -> bool:
+        """Extend the lease; False means another worker has taken the job."""
+        return self._update_owned(
+            job_id, owner, "lease_expires = ?", (time.time() + self.lease_seconds,)
+        )
+
+    def add_stage(self, job_id: str, owner: str, kind: str, data: dict) -> bool:
+        entry = json.dumps({"event": kind, **data, "at": time.time()})
+        return self._update_owned(
+            job_id, owner, "stages = json_insert(stages, '$[#]', json(?))", (entry,)
+        )
+
+    def complete(self, job_id: str, owner: str, result: dict) -> bool:
+        return self._update_owned(
+            job_id, owner, "status = ?, result = ?, lease_owner = NULL",
+            (DONE, json.dumps(result))
+        )
+
+    def fail(self, job_id: str, owner: str, error: str) -> bool:
+        return self._update_owned(
+            job_id, owner, "status = ?, error = ?, lease_owner = NULL", (FAILED, error)
+        )
+
+    def _update_owned(self, job_id: str, owner: str, assignments: str, params) -> bool:
+        with self._lock:
+            cur = self._conn.execute(
+                f"UPDATE jobs SET {assignments}, updated_at = ? "
+                "WHERE id = ? AND status = ? AND lease_owner = ?",
+                (*params, time.time(), job_id, RUNNING, owner)
+            )
+        return cur.rowcount == 1
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+# -----------------------------------
+# Worker processes
+# -----------------------------------
+def run_job(store: JobStore, owner: str, job_id: str, query: str, use_cache: bool):
+    # Imported here so the API process never loads CrewAI for job workers
+    from crew_runner import run_mdagents
+
+    done = threading.Event()
+
+    def keep_lease():
+        while not done.wait(CASE_HEARTBEAT_SECONDS):
+            if not store.heartbeat(job_id, owner):
+                return
+
+    beat = threading.Thread(target=keep_lease, name="case-heartbeat", daemon=True)
+    beat.start()
+    try:
+        result = run_mdagents(
+            query,
+            on_event=lambda kind, data: store.add_stage(job_id, owner, kind, data),
+            use_cache=use_cache,
+        )
+        store.complete(job_id, owner, result)
+    except Exception as e:
+        traceback.print_exc()
+        store.fail(job_id, owner, f"{type(e).__name__}: {e}")
+    finally:
+        done.set()
+        beat.join()
+
+
+def worker_main(path: str, stop):
+    """Claim and run jobs until `stop` (a multiprocessing.Event) is set."""
+    owner = f"{socket.gethostname()}:{os.getpid()}"
+    store = JobStore(path)
+    try:
+        while not stop.is_set():
+            job = store.claim(owner)
+            if job is None:
+                stop.wait(CASE_POLL_SECONDS)
+                continue
+            run_job(store, owner, *job)
+    finally:
+        store.close()
+
+
+class CaseWorkers:
+    """Local pool of job worker processes (spawned, not forked)."""
+
+    def __init__(self, count: int, path: str = JOBS_DB_PATH):
+        self.count = count
+        self.path = path
+        self._ctx = multiprocessing.get_context("spawn")
+        self._stop = self._ctx.Event()
+        self._processes = []
+
+    def start(self):
+        for n in range(self.count):
+            process = self._ctx.Process(
+                target=worker_main, args=(self.path, self._stop),
+                name=f"case-worker-{n}", daemon=True,
+            )
+            process.start()
+            self._processes.append(process)
+
+    def stop(self, timeout: float = 5.0):
+        """
+        Ask workers to stop after their current job. Anything still running
+        after `timeout` is terminated; its lease expires and the job is
+        picked up again on the next start.
+        """
+        self._stop.set()
+        deadline = time.monotonic() + timeout
+        for process in self._processes:
+            process.join(max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                process.terminate()
+        self._processes.clear()
+
+
+store = JobStore(JOBS_DB_PATH)
+workers = CaseWorkers(CASE_WORKERS) if CASE_WORKERS > 0 else None
+
+
+def main(argv):
+    if argv[1:2] != ["work"]:
+        print(__doc__)
+        return 1
+
+    pool = CaseWorkers(max(1, CASE_WORKERS))
+    pool.start()
+    print(f"{pool.count} case worker(s) on {JOBS_DB_PATH}")
+    try:
+        for process in pool._processes:
+            process.join()
+    except KeyboardInterrupt:
+        pool.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
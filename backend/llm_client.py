@@ -0,0 +1,171 @@
+# llm_client.py
+import os
+import json
+import time
+import random
+import asyncio
+import threading
+import httpx
+import metrics
+
+# -----------------------------------
+# Settings
+# -----------------------------------
+LLM_POOL_SIZE = int(os.getenv("LLM_POOL_SIZE", "200"))
+LLM_KEEPALIVE = int(os.getenv("LLM_KEEPALIVE", "50"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "30"))
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "5"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "0.5"))
+LLM_BACKOFF_CAP = float(os.getenv("LLM_BACKOFF_CAP", "8"))
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# -----------------------------------
+# Shared pooled clients
+# -----------------------------------
+# One keep-alive pool per process for each of sync and async calls. The
+# async pool's connections belong to the loop that opened them, so it is
+# only for the server's event loop; aclose() at shutdown lets a later loop
+# (e.g. a new TestClient) start a fresh one. No base_url or auth headers
+# here: callers pass their own, so the same pool can serve OpenRouter and
+# litellm traffic.
+_sync_client: httpx.Client | None = None
+_async_client: httpx.AsyncClient | None = None
+_lock = threading.Lock()
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=LLM_POOL_SIZE,
+        max_keepalive_connections=LLM_KEEPALIVE,
+    )
+
+
+def _timeout(seconds: float | None = None) -> httpx.Timeout:
+    return httpx.Timeout(seconds or LLM_TIMEOUT, connect=LLM_CONNECT_TIMEOUT)
+
+
+def get_sync_client() -> httpx.Client:
+    global _sync_client
+    if _sync_client is None:
+        with _lock:
+            if _sync_client is None:
+                _sync_client = httpx.Client(limits=_limits(), timeout=_timeout())
+    return _sync_client
+
+
+def get_async_client() -> httpx.AsyncClient:
+    global _async_client
+    if _async_client is None:
+        with _lock:
+            if _async_client is None:
+                _async_client = httpx.AsyncClient(limits=_limits(), timeout=_timeout())
+    return _async_client
+
+
+async def aclose():
+    """Close the shared pools (call on server shutdown)."""
+    global _sync_client, _async_client
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = None
+    if _sync_client is not None:
+        _sync_client.close()
+        _sync_client = None
+
+
+# -----------------------------------
+# Retry policy
+# -----------------------------------
+def backoff_delay(attempt: int, response: httpx.Response | None = None) -> float:
+    """
+    Full-jitter exponential backoff. A Retry-After header from the
+    provider wins when present.
+    """
+    if response is not None:
+        retry_after = response.headers.get("Retry-After")
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), LLM_BACKOFF_CAP)
+    return random.uniform(0, min(LLM_BACKOFF_CAP, LLM_BACKOFF_BASE * 2 ** attempt))
+
+
+def retry_delay(attempt: int, response: httpx.Response | None) -> float:
+    """Count the retry in metrics and return how long to wait before it."""
+    reason = str(response.status_code) if response is not None else "transport"
+    metrics.LLM_RETRIES.inc(reason=reason)
+    return backoff_delay(attempt, response)
+
+
+def should_retry(attempt: int, response: httpx.Response | None) -> bool:
+    if attempt >= LLM_MAX_RETRIES:
+        return False
+    return response is None or response.status_code in RETRY_STATUSES
+
+
+def post_json(url: str, payload: dict, headers: dict, timeout: float | None = None) -> dict:
+    """POST with the shared sync pool, retrying 429/5xx and transport errors."""
+    client = get_sync_client()
+    attempt = 0
+    while True:
+        response = None
+        try:
+            response = client.post(url, json=payload, headers=headers, timeout=_timeout(timeout))
+            if response.status_code not in RETRY_STATUSES:
+                response.raise_for_status()
+                return response.json()
+        except httpx.TransportError:
+            if not should_retry(attempt, None):
+                raise
+        if response is not None and not should_retry(attempt, response):
+            response.raise_for_status()
+        time.sleep(retry_delay(attempt, response))
+        attempt += 1
+
+
+async def apost_json(url: str, payload: dict, headers: dict, timeout: float | None = None) -> dict:
+    """Async twin of post_json on the shared async pool."""
+    client = get_async_client()
+    attempt = 0
+    while True:
+        response = None
+        try:
+            response = await client.post(url, json=payload, headers=headers, timeout=_timeout(timeout))
+            if response.status_code not in RETRY_STATUSES:
+                response.raise_for_status()
+                return response.json()
+        except httpx.TransportError:
+            if not should_retry(attempt, None):
+                raise
+        if response is not None and not should_retry(attempt, response):
+            response.raise_for_status()
+        await asyncio.sleep(retry_delay(attempt, response))
+        attempt += 1
+
+
+async def astream_sse(url: str, payload: dict, headers: dict, timeout: float | None = None):
+    """
+    POST a streaming request and yield each `data:` JSON chunk.
+    Retries (429/5xx) only happen before the first byte is received.
+    """
+    client = get_async_client()
+    attempt = 0
+    while True:
+        async with client.stream(
+            "POST", url, json=payload, headers=headers, timeout=_timeout(timeout)
+        ) as response:
+            if response.status_code in RETRY_STATUSES and should_retry(attempt, response):
+                delay = retry_delay(attempt, response)
+            else:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    # Skip blank separators and ": keep-alive" comments
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[5:].strip()
+                    if data == "[DONE]":
+                        return
+                    yield json.loads(data)
+                return
+        await asyncio.sleep(delay)
+        attempt += 1
@@ -0,0 +1,124 @@
+# llm_router.py
+"""
+LiteLLM Router over the deployments in litellm/config.yaml.
+
+With LLM_ROUTER=1, chat completions (chatbot.call_openrouter and friends)
+and the CrewAI agents (agents.RouterLLM) go through one litellm.Router
+instead of a single OpenRouter key. Deployments that share a model_name
+form a group. The router spreads calls over the group (by
+router_settings.routing_strategy, usage-based-routing-v2 in the shipped
+config), keeps each deployment under its rpm/tpm, cools down
+deployments that keep failing and falls back along
+router_settings.fallbacks on 429/5xx.
+
+Building the router imports litellm, which takes seconds: the API server
+builds it at startup, and async callers use aroutes(), which builds it
+on a thread rather than on the event loop.
+
+Values written as "os.environ/NAME" are read from the environment; a
+deployment whose api_key variable is unset is skipped, and an unset
+api_base means the provider default.
+"""
+import os
+import asyncio
+import threading
+import yaml
+
+ROUTER_ENABLED = os.getenv("LLM_ROUTER", "0") == "1"
+ROUTER_CONFIG_PATH = os.getenv(
+    "LLM_ROUTER_CONFIG",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "litellm", "config.yaml"),
+)
+
+_router = None
+_groups: set[str] = set()
+_lock = threading.Lock()
+
+
+def _resolve(value):
+    if isinstance(value, str) and value.startswith("os.environ/"):
+        return os.getenv(value[len("os.environ/"):])
+    return value
+
+
+def load_config(path: str = ROUTER_CONFIG_PATH) -> tuple[list[dict], dict]:
+    """(model_list, router_settings) with environment references resolved."""
+    with open(path) as f:
+        data = yaml.safe_load(f) or {}
+
+    model_list = []
+    for deployment in data.get("model_list") or []:
+        params = {k: _resolve(v) for k, v in (deployment.get("litellm_params") or {}).items()}
+        if "api_key" in params and not params["api_key"]:
+            continue
+        if "api_base" in params and not params["api_base"]:
+            del params["api_base"]
+        model_list.append({**deployment, "litellm_params": params})
+    return model_list, data.get("router_settings") or {}
+
+
+def get_router():
+    global _router, _groups
+    if _router is None:
+        with _lock:
+            if _router is None:
+                from litellm import Router
+
+                model_list, settings = load_config()
+                _groups = {d["model_name"] for d in model_list}
+                _router = Router(model_list=model_list, **settings)
+    return _router
+
+
+def group_for(model: str) -> str:
+    """Router group name for an OpenRouter model id, with or without the provider prefix."""
+    return model.removeprefix("openrouter/")
+
+
+def routes(model: str) -> bool:
+    """True when calls for `model` should go through the router."""
+    if not ROUTER_ENABLED:
+        return False
+    get_router()
+    return group_for(model) in _groups
+
+
+async def aroutes(model: str) -> bool:
+    """routes() for the event loop: a first call builds the router on a thread."""
+    if not ROUTER_ENABLED:
+        return False
+    if _router is None:
+        await asyncio.to_thread(get_router)
+    return group_for(model) in _groups
+
+
+def _params(timeout, extra):
+    params = {k: v for k, v in extra.items() if v is not None}
+    if timeout is not None:
+        params["timeout"] = timeout
+    return params
+
+
+def completion(messages, model: str, timeout=None, **extra) -> dict:
+    """OpenAI-style response dict, like llm_client.post_json."""
+    response = get_router().completion(
+        model=group_for(model), messages=messages, **_params(timeout, extra)
+    )
+    return response.model_dump()
+
+
+async def acompletion(messages, model: str, timeout=None, **extra) -> dict:
+    response = await get_router().acompletion(
+        model=group_for(model), messages=messages, **_params(timeout, extra)
+    )
+    return response.model_dump()
+
+
+async def astream(messages, model: str, timeout=None, **extra):
+    """Yield OpenAI-style chunk dicts, like llm_client.astream_sse."""
+    response = await get_router().acompletion(
+        model=group_for(model), messages=messages, stream=True,
+        stream_options={"include_usage": True}, **_params(timeout, extra)
+    )
+    async for chunk in response:
+        yield chunk.model_dump()
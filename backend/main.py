@@ -174,12 +174,7 @@
 # main.py
 import chatbot
 from crew_runner import run_mdagents
-
-
-def is_medical(text):
-    keywords = ["pain", "fever", "diagnose", "treatment"]
-    text = text.lower()
-    return any(k in text for k in keywords)
+from router import is_medical
 
 
 def cli():
@@ -194,11 +189,11 @@ def cli():
             break
 
         if is_medical(msg):
-            chatbot.save_message(chat_id, "user", msg)
+            chatbot.store.save_message(chat_id, "user", msg)
             result = run_mdagents(msg)
             reply = result.get("final", "No result")
             print("Bot:", reply)
-            chatbot.save_message(chat_id, "assistant", reply)
+            chatbot.store.save_message(chat_id, "assistant", reply)
         else:
             reply = chatbot.general_reply(chat_id, msg)
             print("Bot:", reply)
@@ -0,0 +1,252 @@
+# metrics.py
+"""
+In-process metrics with Prometheus text exposition (served on /metrics).
+
+Deliberately tiny: a lock-protected dict per metric, so recording a
+stage costs a few dictionary updates on the hot path.
+"""
+import os
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+
+# Store a per-message trace row next to messages (see storage.store.save_trace)
+TRACE_ROWS = os.getenv("METRICS_TRACE_ROWS", "0") == "1"
+# Provider prices in USD per million tokens, for llm_cost_usd_total (0 = off)
+PROMPT_PRICE = float(os.getenv("METRICS_PROMPT_PRICE", "0"))
+COMPLETION_PRICE = float(os.getenv("METRICS_COMPLETION_PRICE", "0"))
+# Price of prompt tokens served from the provider's prompt cache
+# (defaults to the full prompt price)
+CACHED_PROMPT_PRICE = float(os.getenv("METRICS_CACHED_PROMPT_PRICE", str(PROMPT_PRICE)))
+
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+
+_registry = []
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _label_str(names, values) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + "}"
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels=()):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(labels.get(n, "") for n in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def collect(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield f"{self.name}{_label_str(self.labels, key)} {value}"
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # key -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels.get(n, "") for n in self.labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def collect(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._series.items()]
+        names = self.labels + ("le",)
+        for key, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                yield f"{self.name}_bucket{_label_str(names, key + (bound,))} {cumulative}"
+            yield f"{self.name}_bucket{_label_str(names, key + ('+Inf',))} {series[-1]}"
+            yield f"{self.name}_sum{_label_str(self.labels, key)} {series[-2]}"
+            yield f"{self.name}_count{_label_str(self.labels, key)} {series[-1]}"
+
+
+class Gauge:
+    """Read at scrape time from a callback returning {label tuple: value}."""
+
+    def __init__(self, name: str, help: str, labels, read):
+        self.name, self.help, self.labels, self.read = name, help, tuple(labels), read
+        _registry.append(self)
+
+    def collect(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} gauge"
+        for key, value in self.read().items():
+            yield f"{self.name}{_label_str(self.labels, key)} {value}"
+
+
+def render() -> str:
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.collect())
+    return "\n".join(lines) + "\n"
+
+
+# -----------------------------------
+# Application metrics
+# -----------------------------------
+STAGE_SECONDS = Histogram(
+    "mdagents_stage_seconds", "Wall time per LLM stage.", ["path", "stage", "tier", "model"]
+)
+REQUEST_SECONDS = Histogram(
+    "chat_request_seconds", "End-to-end wall time per reply.", ["path", "tier"]
+)
+LLM_TOKENS = Counter(
+    "llm_tokens_total", "Tokens reported by the provider (cached_prompt is part of prompt).",
+    ["path", "stage", "tier", "model", "kind"]
+)
+LLM_COST = Counter(
+    "llm_cost_usd_total", "Estimated spend from token counts.", ["path", "stage", "tier", "model"]
+)
+COALESCED = Counter(
+    "mdagents_coalesced_total", "Medical requests that joined an identical in-flight run."
+)
+LLM_RETRIES = Counter(
+    "llm_retries_total", "HTTP retries against the LLM provider.", ["reason"]
+)
+LLM_ERRORS = Counter(
+    "llm_errors_total", "Failed LLM stages.", ["path", "stage", "error"]
+)
+
+
+# -----------------------------------
+# Per-request trace
+# -----------------------------------
+class StageRecord:
+    __slots__ = ("stage", "model", "seconds", "prompt_tokens", "cached_prompt_tokens",
+                 "completion_tokens", "error")
+
+    def __init__(self, stage: str, model: str = ""):
+        self.stage = stage
+        self.model = model
+        self.seconds = 0.0
+        self.prompt_tokens = 0
+        self.cached_prompt_tokens = 0  # part of prompt_tokens read from the prompt cache
+        self.completion_tokens = 0
+        self.error = None
+
+    def add_usage(self, usage):
+        """Accept an OpenAI-style usage dict or a CrewAI UsageMetrics object."""
+        if not usage:
+            return
+        get = usage.get if isinstance(usage, dict) else lambda k, d=0: getattr(usage, k, d)
+        self.prompt_tokens += get("prompt_tokens", 0) or 0
+        self.completion_tokens += get("completion_tokens", 0) or 0
+        # CrewAI sums it up; OpenAI-style usage nests it in prompt_tokens_details
+        cached = get("cached_prompt_tokens", 0)
+        if not cached:
+            details = get("prompt_tokens_details", None) or {}
+            if not isinstance(details, dict):
+                details = vars(details)
+            cached = details.get("cached_tokens")
+        self.cached_prompt_tokens += cached or 0
+
+    @property
+    def cost(self) -> float:
+        return ((self.prompt_tokens - self.cached_prompt_tokens) * PROMPT_PRICE
+                + self.cached_prompt_tokens * CACHED_PROMPT_PRICE
+                + self.completion_tokens * COMPLETION_PRICE) / 1_000_000
+
+    def as_dict(self) -> dict:
+        return {
+            "stage": self.stage,
+            "model": self.model,
+            "ms": round(self.seconds * 1000, 1),
+            "prompt_tokens": self.prompt_tokens,
+            "cached_prompt_tokens": self.cached_prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "cost_usd": round(self.cost, 6),
+            "error": self.error,
+        }
+
+
+class Trace:
+    """Collects the stages of one reply; safe to share across round threads."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.tier = ""
+        self.started = time.perf_counter()
+        self.stages: list[StageRecord] = []
+        self._lock = threading.Lock()
+
+    def add(self, record: StageRecord):
+        with self._lock:
+            self.stages.append(record)
+
+    def finish(self) -> dict:
+        total = time.perf_counter() - self.started
+        REQUEST_SECONDS.observe(total, path=self.path, tier=self.tier)
+        with self._lock:
+            stages = [s.as_dict() for s in self.stages]
+        return {
+            "path": self.path,
+            "tier": self.tier,
+            "total_ms": round(total * 1000, 1),
+            "prompt_tokens": sum(s["prompt_tokens"] for s in stages),
+            "cached_prompt_tokens": sum(s["cached_prompt_tokens"] for s in stages),
+            "stages": stages,
+        }
+
+
+@contextmanager
+def stage(name: str, trace: Trace | None = None, path: str = "mdagents", tier: str = "",
+          model: str = ""):
+    """
+    Time one LLM stage. The caller may attach token usage to the yielded
+    StageRecord; errors are counted and re-raised.
+    """
+    record = StageRecord(name, model)
+    start = time.perf_counter()
+    try:
+        yield record
+    except Exception as e:
+        record.error = type(e).__name__
+        LLM_ERRORS.inc(path=path, stage=name, error=record.error)
+        raise
+    finally:
+        record.seconds = time.perf_counter() - start
+        tier = tier or (trace.tier if trace else "")
+        labels = {"path": path, "stage": name, "tier": tier, "model": model}
+        STAGE_SECONDS.observe(record.seconds, **labels)
+        if record.prompt_tokens:
+            LLM_TOKENS.inc(record.prompt_tokens, kind="prompt", **labels)
+        if record.cached_prompt_tokens:
+            LLM_TOKENS.inc(record.cached_prompt_tokens, kind="cached_prompt", **labels)
+        if record.completion_tokens:
+            LLM_TOKENS.inc(record.completion_tokens, kind="completion", **labels)
+        if record.cost:
+            LLM_COST.inc(record.cost, **labels)
+        if trace is not None:
+            trace.add(record)
@@ -0,0 +1,102 @@
+# model_policy.py
+"""
+Config-driven model choice per agent role and complexity tier.
+
+The `model_policy` section of litellm/config.yaml maps roles (the keys of
+agents.create_agents) to a model, max_tokens and temperature, optionally
+overridden per tier:
+
+    model_policy:
+      roles:
+        moderator: {model: openrouter/deepseek/deepseek-chat, max_tokens: 8}
+      tiers:
+        LOW:
+          primary: {model: openrouter/deepseek/deepseek-chat, max_tokens: 768}
+
+Later entries win: roles → tiers[tier]["*"] → tiers[tier][role]. Anything
+left unset keeps the defaults below. The file is re-read when its
+mtime changes (checked at most every MODEL_POLICY_CHECK_SECONDS), so the
+policy can be edited without restarting the server.
+"""
+import os
+import time
+import hashlib
+import threading
+import traceback
+import yaml
+
+MODEL_POLICY_PATH = os.getenv(
+    "MODEL_POLICY_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "litellm", "config.yaml"),
+)
+MODEL_POLICY_CHECK_SECONDS = float(os.getenv("MODEL_POLICY_CHECK_SECONDS", "2"))
+
+FIELDS = ("model", "max_tokens", "temperature")
+
+# The agents' LLM settings when the policy does not say otherwise
+DEFAULT_MODEL = "openrouter/deepseek/deepseek-r1"
+DEFAULT_MAX_TOKENS = 2048
+DEFAULT_TEMPERATURE = 0.3
+
+
+class ModelPolicy:
+    def __init__(self, path: str, check_seconds: float = MODEL_POLICY_CHECK_SECONDS):
+        self.path = path
+        self.check_seconds = check_seconds
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._checked = None
+        self._rules = ({}, {})  # (roles, tiers), swapped as one
+        self.version = "none"
+
+    def settings(self, role: str, tier: str = "") -> dict:
+        """Overrides for `role` at `tier` ("" before triage): a subset of FIELDS."""
+        self._maybe_reload()
+        roles, tiers = self._rules
+        tier_rules = tiers.get(tier, {})
+        merged = {}
+        for rule in (roles.get(role), tier_rules.get("*"), tier_rules.get(role)):
+            if rule:
+                merged.update((k, v) for k, v in rule.items() if k in FIELDS)
+        return merged
+
+    def current_version(self) -> str:
+        """Fingerprint of the policy in force (part of result cache keys)."""
+        self._maybe_reload()
+        return self.version
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if self._checked is not None and now - self._checked < self.check_seconds:
+            return
+        with self._lock:
+            if self._checked is not None and now - self._checked < self.check_seconds:
+                return
+            self._checked = now
+            try:
+                mtime = os.stat(self.path).st_mtime
+            except FileNotFoundError:
+                mtime = None
+            if mtime != self._mtime:
+                self._load(mtime)
+
+    def _load(self, mtime):
+        """Swap in the new policy; a broken file keeps the last good one."""
+        try:
+            data = {}
+            if mtime is not None:
+                with open(self.path) as f:
+                    data = yaml.safe_load(f) or {}
+            policy = data.get("model_policy") or {}
+            roles = policy.get("roles") or {}
+            tiers = {str(k).upper(): v or {} for k, v in (policy.get("tiers") or {}).items()}
+        except Exception:
+            traceback.print_exc()
+            self._mtime = mtime  # report once, retry on the next edit
+            return
+        self._rules = (roles, tiers)
+        self._mtime = mtime
+        self.version = hashlib.sha1(repr((roles, tiers)).encode()).hexdigest()[:12]
+
+
+policy = ModelPolicy(MODEL_POLICY_PATH)
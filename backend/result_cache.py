@@ -0,0 +1,119 @@
+# result_cache.py
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+import unicodedata
+
+# -----------------------------------
+# Settings
+# -----------------------------------
+CACHE_ENABLED = os.getenv("MDAGENTS_CACHE", "1") == "1"
+# Same SQLite file as the chat history unless pointed at a sidecar
+CACHE_PATH = os.getenv("MDAGENTS_CACHE_PATH", os.getenv("CHAT_DB_PATH", "chat_history.db"))
+CACHE_TTL = int(os.getenv("MDAGENTS_CACHE_TTL", str(7 * 24 * 3600)))
+CACHE_MAX_ENTRIES = int(os.getenv("MDAGENTS_CACHE_MAX_ENTRIES", "10000"))
+# A hit only rewrites last_used once it is this stale (LRU at this granularity)
+CACHE_TOUCH_SECONDS = int(os.getenv("MDAGENTS_CACHE_TOUCH_SECONDS", "300"))
+
+
+def normalize(text: str) -> str:
+    """Case-, width- and whitespace-insensitive form of a case prompt."""
+    return " ".join(unicodedata.normalize("NFKC", text).casefold().split())
+
+
+def cache_key(query: str, version: str) -> str:
+    return hashlib.sha256(f"{version}\n{normalize(query)}".encode()).hexdigest()
+
+
+class ResultCache:
+    """
+    Persistent run_mdagents result cache.
+
+    Entries expire after `ttl` seconds; beyond `max_entries` the least
+    recently used ones are evicted. Recency is tracked to within
+    `touch_seconds`, so a hot key costs a write at most that often.
+    Keys already include the pipeline version, so changing prompts or
+    models simply stops hitting old rows.
+    """
+
+    def __init__(self, path: str, ttl: int, max_entries: int,
+                 touch_seconds: int = CACHE_TOUCH_SECONDS):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.touch_seconds = touch_seconds
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS mdagents_cache (
+                key TEXT PRIMARY KEY,
+                complexity TEXT NOT NULL,
+                reasoning TEXT NOT NULL,
+                final TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_mdagents_cache_used ON mdagents_cache (last_used);
+        """)
+
+    def get(self, key: str) -> dict | None:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                """
+                SELECT complexity, reasoning, final, created_at, last_used
+                  FROM mdagents_cache WHERE key = ?
+                """,
+                (key,)
+            ).fetchone()
+            if row is None or row[3] < now - self.ttl:
+                self.misses += 1
+                return None
+            if row[4] < now - self.touch_seconds:
+                self._conn.execute(
+                    "UPDATE mdagents_cache SET last_used = ? WHERE key = ?", (now, key)
+                )
+                self._conn.commit()
+            self.hits += 1
+
+        complexity, reasoning, final, _, _ = row
+        return {"final": final, "reasoning": json.loads(reasoning), "complexity": complexity}
+
+    def put(self, key: str, result: dict):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                """
+                INSERT OR REPLACE INTO mdagents_cache
+                    (key, complexity, reasoning, final, created_at, last_used)
+                VALUES (?, ?, ?, ?, ?, ?)
+                """,
+                (key, result["complexity"], json.dumps(result["reasoning"]),
+                 result["final"], now, now)
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now: float):
+        self._conn.execute("DELETE FROM mdagents_cache WHERE created_at < ?", (now - self.ttl,))
+        self._conn.execute(
+            """
+            DELETE FROM mdagents_cache WHERE key IN (
+                SELECT key FROM mdagents_cache ORDER BY last_used ASC
+                 LIMIT max(0, (SELECT COUNT(*) FROM mdagents_cache) - ?)
+            )
+            """,
+            (self.max_entries,)
+        )
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM mdagents_cache").fetchone()[0]
+            return {"hits": self.hits, "misses": self.misses, "entries": entries}
+
+
+cache = ResultCache(CACHE_PATH, CACHE_TTL, CACHE_MAX_ENTRIES) if CACHE_ENABLED else None
@@ -0,0 +1,65 @@
+# router.py
+"""
+Medical-intent router shared by the API server and the CLI.
+
+All keywords are compiled once into a single regex with one group per
+keyword. Matches are word-boundary aware ("ct" no longer fires inside
+"act" or "fact") and accept simple plurals. Each keyword carries a
+weight; a message is routed to the MDAgents pipeline when the summed
+weight of the distinct keywords it contains reaches the threshold.
+"""
+import os
+import re
+
+ROUTER_THRESHOLD = float(os.getenv("ROUTER_THRESHOLD", "1.0"))
+
+# (pattern, weight). Weight 1.0 routes on its own; 0.5 needs company
+# ("chest" alone is ambiguous, "chest pain" is not).
+KEYWORDS = [
+    (r"pains?|painful", 1.0),
+    (r"fevers?|febrile", 1.0),
+    (r"infections?", 1.0),
+    (r"infected", 1.0),
+    (r"diagnos(?:e|es|ed|is)", 1.0),
+    (r"treatments?", 1.0),
+    (r"sepsis|septic", 1.0),
+    (r"mri", 1.0),
+    (r"injur(?:y|ies|ed)", 1.0),
+    (r"cancers?", 1.0),
+    (r"strokes?", 1.0),
+    (r"diseases?", 1.0),
+    (r"symptoms?", 1.0),
+    (r"surgery|surgical", 1.0),
+    (r"ultrasound", 1.0),
+    (r"vomiting", 1.0),
+    (r"diabetes|diabetic", 1.0),
+    (r"\d+[- ]year[- ]old", 1.0),
+    (r"y/o", 1.0),
+    (r"medical", 1.0),
+    (r"scans?", 0.5),
+    (r"ct", 0.5),
+    (r"doctor", 0.5),
+    (r"chest", 0.5),
+    (r"abdomen|abdominal", 0.5),
+    (r"breathing", 0.5),
+]
+
+_WEIGHTS = [weight for _, weight in KEYWORDS]
+_PATTERN = re.compile(
+    r"(?<!\w)(?:" + "|".join(f"({p})" for p, _ in KEYWORDS) + r")(?!\w)",
+    re.IGNORECASE,
+)
+
+
+def score(text: str) -> float:
+    """Summed weight of the distinct keywords found in `text`."""
+    seen = {m.lastindex for m in _PATTERN.finditer(text)}
+    return sum(_WEIGHTS[i - 1] for i in seen)
+
+
+def is_medical(text: str, threshold: float = ROUTER_THRESHOLD) -> bool:
+    return score(text) >= threshold
+
+
+def classify_many(texts, threshold: float = ROUTER_THRESHOLD) -> list[bool]:
+    return [score(text) >= threshold for text in texts]
@@ -0,0 +1,275 @@
+# scheduler.py
+"""
+Priority and fair-share admission for LLM work in the API server.
+
+Every general-chat reply and medical case asks for a Ticket before it
+runs. A ticket carries a class, a client key and a weight: how many LLM
+calls the work can have in flight at once. Tickets are granted while
+the weights in use stay within `capacity`, the global in-flight LLM call
+limit, which is derived from the provider rate limit by Little's law:
+
+    capacity = LLM_RPM × LLM_CALL_SECONDS / 60 / WEB_CONCURRENCY
+
+so that, at the typical call latency, we never start calls faster than
+the provider accepts them. The limit is enforced per process: with
+several uvicorn workers each gets its share (WEB_CONCURRENCY, the
+worker count uvicorn itself reads), so the total stays within the rate
+limit. LLM_MAX_INFLIGHT, when set, is already the per-process limit.
+
+Medical cases also run on an executor.pool thread, so a ticket that
+needs one is only granted while a worker is free: granted weight is
+always running, never parked in the executor's own FIFO queue. Batch
+cases, which run on their own threads, wait in the same queues through
+hold(). Case worker processes cannot share this process's queues, so
+the weight they may use is reserved up front (reserve()).
+
+Waiting tickets are served by class first (CLASSES order: quick chat
+before LOW cases before heavier ones), then round-robin over clients
+within a class, so one client queueing twenty HIGH cases gets one turn
+per round like everybody else.
+
+Queue wait per class is exported as scheduler_queue_wait_seconds.
+"""
+import os
+import math
+import time
+import asyncio
+import threading
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+import executor
+import llm_router
+import metrics
+
+# -----------------------------------
+# Settings
+# -----------------------------------
+# Provider requests per minute; with LLM_ROUTER=1 the sum of the
+# deployments' rpm in litellm/config.yaml unless set explicitly
+LLM_RPM = os.getenv("LLM_RPM")
+# Typical wall time of one LLM call
+LLM_CALL_SECONDS = float(os.getenv("LLM_CALL_SECONDS", "15"))
+# Explicit per-process in-flight limit, overriding the derived one
+LLM_MAX_INFLIGHT = os.getenv("LLM_MAX_INFLIGHT")
+# Server processes sharing the provider rate limit
+WEB_CONCURRENCY = max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+# Tickets allowed to wait; more are rejected with 429
+SCHEDULER_QUEUE_SIZE = int(os.getenv("SCHEDULER_QUEUE_SIZE", "256"))
+
+# Highest priority first. Medical cases use the local triage prediction;
+# a case triage is not sure about is treated as MODERATE.
+CLASSES = ("chat", "LOW", "MODERATE", "HIGH")
+
+QUEUE_WAIT = metrics.Histogram(
+    "scheduler_queue_wait_seconds", "Time from enqueue to grant per priority class.", ["klass"]
+)
+
+
+def provider_rpm() -> float:
+    if LLM_RPM:
+        return float(LLM_RPM)
+    if llm_router.ROUTER_ENABLED:
+        model_list, _ = llm_router.load_config()
+        rpm = sum(d["litellm_params"].get("rpm") or 0 for d in model_list)
+        if rpm:
+            return rpm
+    return 60.0
+
+
+def default_capacity() -> int:
+    if LLM_MAX_INFLIGHT:
+        return max(1, int(LLM_MAX_INFLIGHT))
+    return max(1, math.floor(provider_rpm() * LLM_CALL_SECONDS / 60 / WEB_CONCURRENCY))
+
+
+class Ticket:
+    def __init__(self, scheduler: "Scheduler", klass: str, client: str, weight: int,
+                 worker: bool = False):
+        self.scheduler = scheduler
+        self.klass = klass
+        self.client = client
+        self.weight = weight
+        self.worker = worker
+        self.enqueued = time.monotonic()
+        self.granted = False
+        self.released = False
+        try:
+            self._loop = asyncio.get_running_loop()
+            self._ready = self._loop.create_future()
+        except RuntimeError:
+            # Enqueued from a plain thread, which waits in wait_blocking()
+            self._loop = None
+            self._event = threading.Event()
+
+    def _grant(self):
+        # Called with the scheduler lock held, from any thread
+        self.granted = True
+        QUEUE_WAIT.observe(time.monotonic() - self.enqueued, klass=self.klass)
+        if self._loop is None:
+            self._event.set()
+        else:
+            self._loop.call_soon_threadsafe(self._wake)
+
+    def _wake(self):
+        if not self._ready.done():
+            self._ready.set_result(None)
+
+    async def wait(self):
+        """Return once granted; a cancelled wait gives up the place or the grant."""
+        try:
+            await asyncio.shield(self._ready)
+        except asyncio.CancelledError:
+            self.release()
+            raise
+
+    def wait_blocking(self):
+        """wait() for a ticket enqueued off the event loop."""
+        self._event.wait()
+
+    def release(self):
+        """Hand the weight back (or leave the queue). Safe to call twice, from any thread."""
+        self.scheduler._release(self)
+
+    def release_weight(self):
+        """Hand back the weight but keep the worker: the work now only waits on other work."""
+        self.scheduler._release_weight(self)
+
+
+class Scheduler:
+    def __init__(self, capacity: int, max_queue: int = SCHEDULER_QUEUE_SIZE,
+                 retry_after: int = executor.WORKER_RETRY_AFTER,
+                 workers: int | None = None):
+        self.capacity = capacity
+        self.max_queue = max_queue
+        self.retry_after = retry_after
+        # Worker threads for worker=True tickets (None = no limit)
+        self.workers = workers
+        self.reserved = 0
+        self._lock = threading.Lock()
+        self._in_use = 0
+        self._workers_in_use = 0
+        self._waiting = 0
+        # class → client → tickets in arrival order; clients rotate after each grant
+        self._queues = {klass: OrderedDict() for klass in CLASSES}
+
+    def enqueue(self, klass: str, client: str, weight: int = 1,
+                worker: bool = False) -> Ticket:
+        """
+        Queue a ticket (from the event loop, or from a thread, which then
+        waits with wait_blocking()). worker=True tickets also take one of
+        `workers` threads. Raises executor.QueueFull when
+        SCHEDULER_QUEUE_SIZE tickets are already waiting.
+        """
+        ticket = Ticket(self, klass, client, max(1, min(weight, self.capacity)), worker)
+        with self._lock:
+            if self._waiting >= self.max_queue:
+                raise executor.QueueFull(self.retry_after)
+            self._queues[klass].setdefault(client, deque()).append(ticket)
+            self._waiting += 1
+            self._dispatch()
+        return ticket
+
+    def slot(self, klass: str, client: str, weight: int = 1):
+        """async with scheduler.slot(...): run the block holding a granted ticket."""
+        return _Slot(self, klass, client, weight)
+
+    @contextmanager
+    def hold(self, klass: str, client: str, weight: int = 1):
+        """with scheduler.hold(...): slot() for a plain thread (blocks until granted)."""
+        ticket = self.enqueue(klass, client, weight)
+        try:
+            ticket.wait_blocking()
+            yield ticket
+        finally:
+            ticket.release()
+
+    def reserve(self, weight: int):
+        """Set aside weight used outside this scheduler (e.g. case worker processes)."""
+        with self._lock:
+            self.reserved += weight
+            self.capacity = max(1, self.capacity - weight)
+
+    def _release(self, ticket: Ticket):
+        with self._lock:
+            if ticket.released:
+                return
+            ticket.released = True
+            if ticket.granted:
+                self._in_use -= ticket.weight
+                self._workers_in_use -= ticket.worker
+            else:
+                clients = self._queues[ticket.klass]
+                tickets = clients.get(ticket.client)
+                if tickets and ticket in tickets:
+                    tickets.remove(ticket)
+                    self._waiting -= 1
+                    if not tickets:
+                        del clients[ticket.client]
+            self._dispatch()
+
+    def _release_weight(self, ticket: Ticket):
+        with self._lock:
+            if ticket.released or not ticket.granted:
+                return
+            self._in_use -= ticket.weight
+            ticket.weight = 0
+            self._dispatch()
+
+    def _dispatch(self):
+        # Lock held. Strict class priority; the head ticket waits for room
+        # rather than being overtaken, so heavy cases are not starved by
+        # a stream of light ones in the same class.
+        for klass in CLASSES:
+            clients = self._queues[klass]
+            while clients:
+                client, tickets = next(iter(clients.items()))
+                ticket = tickets[0]
+                if self._in_use + ticket.weight > self.capacity:
+                    return
+                if ticket.worker and self.workers is not None \
+                        and self._workers_in_use >= self.workers:
+                    return
+                tickets.popleft()
+                self._waiting -= 1
+                del clients[client]
+                if tickets:
+                    clients[client] = tickets  # back of the round
+                self._in_use += ticket.weight
+                self._workers_in_use += ticket.worker
+                ticket._grant()
+
+    def stats(self) -> dict:
+        with self._lock:
+            queued = {
+                klass: sum(len(t) for t in clients.values())
+                for klass, clients in self._queues.items()
+            }
+            # capacity and in_flight are for this process only
+            return {
+                "capacity": self.capacity,
+                "reserved": self.reserved,
+                "in_flight": self._in_use,
+                "workers": self.workers,
+                "workers_in_use": self._workers_in_use,
+                "queued": queued,
+                "scope": "process",
+                "processes": WEB_CONCURRENCY,
+            }
+
+
+class _Slot:
+    def __init__(self, scheduler: Scheduler, klass: str, client: str, weight: int):
+        self.args = (klass, client, weight)
+        self.scheduler = scheduler
+        self.ticket = None
+
+    async def __aenter__(self):
+        self.ticket = self.scheduler.enqueue(*self.args)
+        await self.ticket.wait()
+        return self.ticket
+
+    async def __aexit__(self, *exc):
+        self.ticket.release()
+
+
+scheduler = Scheduler(default_capacity(), workers=executor.pool.max_workers)
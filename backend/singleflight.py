@@ -0,0 +1,96 @@
+# singleflight.py
+"""
+Coalesce concurrent identical calls into one in-flight computation.
+
+The first caller for a key runs the work; callers that arrive while it is
+running wait on the same Future and get the same result or exception.
+Progress events are fanned out to every caller, with the events already
+emitted replayed to late joiners.
+"""
+import threading
+from concurrent.futures import Future
+
+
+class Flight:
+    def __init__(self):
+        self.future = Future()
+        self._lock = threading.Lock()
+        self._events = []
+        self._listeners = []
+
+    def subscribe(self, listener):
+        with self._lock:
+            for kind, data in self._events:
+                listener(kind, data)
+            self._listeners.append(listener)
+
+    def emit(self, kind, data):
+        with self._lock:
+            self._events.append((kind, data))
+            listeners = list(self._listeners)
+        for listener in listeners:
+            listener(kind, data)
+
+
+class SingleFlight:
+    def __init__(self, on_join=None):
+        # on_join() runs for every caller that joins an existing flight
+        self.on_join = on_join
+        self._lock = threading.Lock()
+        self._flights: dict[str, Flight] = {}
+
+    def do(self, key: str, fn, on_event=None, on_join=None):
+        """
+        Return fn(emit) for `key`, running it only if no identical call is
+        in flight. `emit(kind, data)` reaches every caller's on_event.
+        on_join() runs, before waiting, if this call joins an existing flight.
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = Flight()
+
+        if on_event:
+            flight.subscribe(on_event)
+
+        if not leader:
+            self._joined(on_join)
+            return flight.future.result()
+
+        try:
+            result = fn(flight.emit)
+        except BaseException as e:
+            flight.future.set_exception(e)
+            raise
+        else:
+            flight.future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._flights[key]
+
+    def join(self, key: str, on_event=None) -> Future | None:
+        """
+        Join the flight for `key` without blocking: its Future, or None
+        when nothing identical is in flight. Never cancel the Future, it
+        is shared with the leader.
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+        if flight is None:
+            return None
+        if on_event:
+            flight.subscribe(on_event)
+        self._joined()
+        return flight.future
+
+    def _joined(self, on_join=None):
+        if self.on_join:
+            self.on_join()
+        if on_join:
+            on_join()
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._flights)
@@ -0,0 +1,638 @@
+# storage.py
+"""
+Chat store: messages, chats, summaries, traces and full-text search in
+SQLite, behind one repository object (`store`).
+
+Every thread gets its own connection from ConnectionPool, so FastAPI
+threadpool workers read side by side (WAL) and never share a cursor.
+Writes take the write lock up front (BEGIN IMMEDIATE) and wait up to
+CHAT_DB_BUSY_MS for it, which is also what keeps several uvicorn worker
+processes on one database file from failing with "database is locked".
+"""
+import os
+import json
+import time
+import html
+import base64
+import queue
+import atexit
+import sqlite3
+import logging
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+import metrics
+
+# -----------------------------------
+# Settings
+# -----------------------------------
+DB_PATH = os.getenv("CHAT_DB_PATH", "chat_history.db")
+# WAL lets readers proceed while a write transaction is open
+DB_WAL = os.getenv("CHAT_DB_WAL", "1") == "1"
+# How long a writer waits for the lock held by another thread or process
+DB_BUSY_MS = int(os.getenv("CHAT_DB_BUSY_MS", "5000"))
+# Write-behind: save_message queues rows for a background batching writer
+DB_WRITE_BEHIND = os.getenv("CHAT_DB_WRITE_BEHIND", "0") == "1"
+DB_FLUSH_MS = int(os.getenv("CHAT_DB_FLUSH_MS", "50"))
+DB_FLUSH_ROWS = int(os.getenv("CHAT_DB_FLUSH_ROWS", "500"))
+# Attempts at a failed write-behind batch before falling back to row-by-row
+DB_WRITE_RETRIES = int(os.getenv("CHAT_DB_WRITE_RETRIES", "3"))
+
+MAX_ROWID = 2**63 - 1
+
+log = logging.getLogger(__name__)
+
+LOST_ROWS = metrics.Counter(
+    "chat_writer_lost_rows_total", "Write-behind messages that could not be stored."
+)
+
+
+# -----------------------------------
+# Connections
+# -----------------------------------
+class ConnectionPool:
+    """
+    One connection per thread, opened on first use and kept for the life
+    of the thread. Connections are in autocommit mode: a read is its own
+    snapshot, and writes go through transaction().
+    """
+
+    def __init__(self, path: str, wal: bool = DB_WAL, busy_ms: int = DB_BUSY_MS):
+        self.path = path
+        self.wal = wal
+        self.busy_ms = busy_ms
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._all: list[sqlite3.Connection] = []
+        # Auto-create folder if a custom path is used
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    def connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # check_same_thread=False only so close() can run from another thread
+            conn = sqlite3.connect(self.path, check_same_thread=False,
+                                   timeout=self.busy_ms / 1000, isolation_level=None)
+            if self.wal:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            with self._lock:
+                self._all.append(conn)
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        """Write transaction on this thread's connection; commits on success."""
+        conn = self.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def size(self) -> int:
+        with self._lock:
+            return len(self._all)
+
+    def close(self):
+        with self._lock:
+            conns, self._all = self._all, []
+        for conn in conns:
+            conn.close()
+        self._local = threading.local()
+
+
+# -----------------------------------
+# Schema
+# -----------------------------------
+# Schema migrations, applied in order and tracked with PRAGMA user_version.
+# Keep them idempotent: workers starting together may both apply one.
+MIGRATIONS = [
+    # 0 — messages, the original table
+    """
+    CREATE TABLE IF NOT EXISTS messages (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        chat_id TEXT NOT NULL,
+        role TEXT NOT NULL,
+        message TEXT NOT NULL,
+        created_at TEXT NOT NULL
+    );
+    """,
+    # 1 — chats: one row per conversation for the sidebar, backfilled
+    #     from existing messages.
+    """
+    CREATE TABLE IF NOT EXISTS chats (
+        id TEXT PRIMARY KEY,
+        title TEXT,
+        created_at TEXT NOT NULL,
+        updated_at TEXT NOT NULL,
+        message_count INTEGER NOT NULL DEFAULT 0
+    );
+    CREATE INDEX IF NOT EXISTS idx_chats_updated ON chats (updated_at DESC, id DESC);
+
+    INSERT OR IGNORE INTO chats (id, title, created_at, updated_at, message_count)
+    SELECT m.chat_id,
+           (SELECT substr(u.message, 1, 50) FROM messages u
+             WHERE u.chat_id = m.chat_id AND u.role = 'user'
+             ORDER BY u.id ASC LIMIT 1),
+           MIN(m.created_at), MAX(m.created_at), COUNT(*)
+      FROM messages m
+     GROUP BY m.chat_id;
+    """,
+    # 2 — per-chat lookups (get_history / delete_chat) use an index
+    #     instead of scanning messages.
+    """
+    CREATE INDEX IF NOT EXISTS idx_messages_chat ON messages (chat_id, id);
+    """,
+    # 3 — rolling summaries of turns that fell out of the context window
+    """
+    CREATE TABLE IF NOT EXISTS chat_summaries (
+        chat_id TEXT PRIMARY KEY,
+        summary TEXT NOT NULL,
+        summarized_count INTEGER NOT NULL,
+        updated_at TEXT NOT NULL
+    );
+    """,
+    # 4 — optional per-reply stage timings and token counts (METRICS_TRACE_ROWS=1)
+    """
+    CREATE TABLE IF NOT EXISTS message_traces (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        chat_id TEXT NOT NULL,
+        path TEXT NOT NULL,
+        tier TEXT,
+        total_ms REAL NOT NULL,
+        trace TEXT NOT NULL,
+        created_at TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_message_traces_chat ON message_traces (chat_id, id);
+    """,
+    # 5 — full-text index over message text (external content: the text
+    #     itself stays in messages), kept in step by triggers and
+    #     backfilled from existing rows.
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+        message,
+        content='messages',
+        content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    );
+    CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN
+        INSERT INTO messages_fts (rowid, message) VALUES (new.id, new.message);
+    END;
+    CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN
+        INSERT INTO messages_fts (messages_fts, rowid, message) VALUES ('delete', old.id, old.message);
+    END;
+    CREATE TRIGGER IF NOT EXISTS messages_fts_update AFTER UPDATE OF message ON messages BEGIN
+        INSERT INTO messages_fts (messages_fts, rowid, message) VALUES ('delete', old.id, old.message);
+        INSERT INTO messages_fts (rowid, message) VALUES (new.id, new.message);
+    END;
+    INSERT INTO messages_fts (messages_fts) VALUES ('rebuild');
+    """,
+    # 6 — persistent queue of asynchronous medical cases (see jobs.py)
+    """
+    CREATE TABLE IF NOT EXISTS jobs (
+        id TEXT PRIMARY KEY,
+        query TEXT NOT NULL,
+        use_cache INTEGER NOT NULL DEFAULT 1,
+        status TEXT NOT NULL,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        stages TEXT NOT NULL DEFAULT '[]',
+        result TEXT,
+        error TEXT,
+        lease_owner TEXT,
+        lease_expires REAL,
+        created_at REAL NOT NULL,
+        updated_at REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_jobs_claim ON jobs (status, created_at);
+    """,
+]
+
+
+def migrate(conn):
+    # The messages table predates user_version, so version 0 may already
+    # have it; its CREATE is a no-op then.
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version == 0:
+        conn.executescript(f"BEGIN IMMEDIATE; {MIGRATIONS[0]} COMMIT;")
+    for number, script in enumerate(MIGRATIONS[version + 1:], start=version + 1):
+        conn.executescript(f"BEGIN IMMEDIATE; {script} PRAGMA user_version = {number}; COMMIT;")
+
+
+def touch_chat(conn, chat_id: str, role: str, message: str, ts: str):
+    """Keep the chats row in step with a newly inserted message."""
+    title = message[:50] if role == "user" else None
+    conn.execute(
+        """
+        INSERT INTO chats (id, title, created_at, updated_at, message_count)
+        VALUES (?, ?, ?, ?, 1)
+        ON CONFLICT(id) DO UPDATE SET
+            title = COALESCE(chats.title, excluded.title),
+            updated_at = excluded.updated_at,
+            message_count = chats.message_count + 1
+        """,
+        (chat_id, title, ts, ts)
+    )
+
+
+# -----------------------------------
+# Write-behind batching writer
+# -----------------------------------
+class BatchWriter:
+    """
+    Background writer that groups message inserts into one transaction
+    every `flush_ms` milliseconds or `max_rows` rows, whichever comes first.
+
+    It writes through its own thread's connection. Readers call
+    wait_for(chat_id) first, which forces an immediate flush if that chat
+    has rows still queued, so a chat always reads its own writes. After
+    close(), put() writes on the caller's thread instead.
+    """
+
+    FLUSH = object()
+    STOP = object()
+
+    def __init__(self, pool: ConnectionPool, flush_ms: int, max_rows: int):
+        self.pool = pool
+        self.flush_ms = flush_ms
+        self.max_rows = max_rows
+        self._queue: queue.Queue = queue.Queue()
+        self._cond = threading.Condition()
+        self._pending: Counter = Counter()
+        self._closed = False
+        self._thread = threading.Thread(target=self._loop, name="chat-writer", daemon=True)
+        self._thread.start()
+
+    def put(self, chat_id: str, role: str, message: str, ts: str):
+        with self._cond:
+            if not self._closed:
+                self._pending[chat_id] += 1
+                self._queue.put((chat_id, role, message, ts))
+                return
+        # No writer thread any more: write it now
+        self._insert([(chat_id, role, message, ts)])
+
+    def wait_for(self, chat_id: str):
+        with self._cond:
+            if not self._pending[chat_id]:
+                return
+            self._queue.put(self.FLUSH)
+            while self._pending[chat_id]:
+                self._cond.wait()
+
+    def flush(self):
+        with self._cond:
+            if not +self._pending:
+                return
+            self._queue.put(self.FLUSH)
+            while +self._pending:
+                self._cond.wait()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+        if self._thread.is_alive():
+            self._queue.put(self.STOP)
+            self._thread.join()
+
+    def _loop(self):
+        while True:
+            item = self._queue.get()
+            if item is self.STOP:
+                return
+            batch = [] if item is self.FLUSH else [item]
+            deadline = time.monotonic() + self.flush_ms / 1000
+
+            stop = False
+            while batch and len(batch) < self.max_rows:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is self.FLUSH:
+                    break
+                if item is self.STOP:
+                    stop = True
+                    break
+                batch.append(item)
+
+            if batch:
+                self._write(batch)
+            if stop:
+                self._drain()
+                return
+
+    def _drain(self):
+        rest = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if isinstance(item, tuple):
+                rest.append(item)
+        if rest:
+            self._write(rest)
+
+    def _insert(self, rows):
+        with self.pool.transaction() as conn:
+            conn.executemany(
+                "INSERT INTO messages (chat_id, role, message, created_at) VALUES (?, ?, ?, ?)",
+                rows
+            )
+            for row in rows:
+                touch_chat(conn, *row)
+
+    def _write(self, batch):
+        # Retry the batch with backoff (e.g. the lock held past the busy
+        # timeout), then row by row so one bad row cannot lose the rest;
+        # rows that still fail are logged and counted, never dropped silently
+        try:
+            for attempt in range(DB_WRITE_RETRIES):
+                try:
+                    self._insert(batch)
+                    return
+                except Exception:
+                    log.warning("chat writer: batch of %d rows failed (attempt %d/%d)",
+                                len(batch), attempt + 1, DB_WRITE_RETRIES, exc_info=True)
+                    time.sleep(0.05 * 2 ** attempt)
+            lost = 0
+            for row in batch:
+                try:
+                    self._insert([row])
+                except Exception:
+                    lost += 1
+                    log.exception("chat writer: could not store a message of chat %s", row[0])
+            if lost:
+                LOST_ROWS.inc(lost)
+                log.error("chat writer: lost %d of %d messages", lost, len(batch))
+        finally:
+            with self._cond:
+                for chat_id, *_ in batch:
+                    self._pending[chat_id] -= 1
+                    if not self._pending[chat_id]:
+                        del self._pending[chat_id]
+                self._cond.notify_all()
+
+
+# -----------------------------------
+# Cursors & search syntax
+# -----------------------------------
+def encode_cursor(updated_at: str, chat_id: str) -> str:
+    raw = json.dumps([updated_at, chat_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_cursor(cursor: str):
+    """(updated_at, chat_id) from encode_cursor; ValueError for anything else."""
+    data = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    if not (isinstance(data, list) and len(data) == 2
+            and all(isinstance(part, str) for part in data)):
+        raise ValueError("Invalid cursor.")
+    updated_at, chat_id = data
+    return updated_at, chat_id
+
+
+def fts_query(text: str) -> str:
+    """
+    Turn user input into an FTS5 expression: every word must match, as a
+    literal phrase (so quotes, AND/OR/NEAR and other syntax can't break
+    the query); a trailing * keeps prefix matching, e.g. "pneumo*".
+    """
+    terms = []
+    for word in text.split():
+        prefix = word.endswith("*")
+        word = word.rstrip("*").replace('"', '""')
+        if word:
+            terms.append(f'"{word}"' + ("*" if prefix else ""))
+    return " ".join(terms)
+
+
+# snippet() markers: private-use characters, swapped for <mark> after escaping
+MARK_START, MARK_END = "\ue000", "\ue001"
+
+
+def highlight(snippet: str) -> str:
+    """An FTS snippet as safe HTML: message text escaped, matches in <mark>."""
+    return html.escape(snippet).replace(MARK_START, "<mark>").replace(MARK_END, "</mark>")
+
+
+def utcnow() -> str:
+    return datetime.utcnow().isoformat() + "Z"
+
+
+# -----------------------------------
+# Repository
+# -----------------------------------
+class ChatStore:
+    def __init__(self, pool: ConnectionPool, write_behind: bool = DB_WRITE_BEHIND):
+        self.pool = pool
+        migrate(pool.connection())
+        self.writer = BatchWriter(pool, DB_FLUSH_MS, DB_FLUSH_ROWS) if write_behind else None
+
+    def _read(self, sql: str, params=()):
+        return self.pool.connection().execute(sql, params)
+
+    def _sync(self, chat_id: str):
+        if self.writer is not None:
+            self.writer.wait_for(chat_id)
+
+    def close(self):
+        """Flush queued writes, stop the writer and close every connection."""
+        if self.writer is not None:
+            self.writer.close()
+        self.pool.close()
+
+    # Messages
+    def save_message(self, chat_id: str, role: str, message: str):
+        ts = utcnow()
+        if self.writer is not None:
+            self.writer.put(chat_id, role, message, ts)
+            return
+        with self.pool.transaction() as conn:
+            conn.execute(
+                "INSERT INTO messages (chat_id, role, message, created_at) VALUES (?, ?, ?, ?)",
+                (chat_id, role, message, ts)
+            )
+            touch_chat(conn, chat_id, role, message, ts)
+
+    def get_history(self, chat_id: str):
+        self._sync(chat_id)
+        return self._read(
+            "SELECT role, message, created_at FROM messages WHERE chat_id = ? ORDER BY id ASC",
+            (chat_id,)
+        ).fetchall()
+
+    def last_message(self, chat_id: str):
+        """(id, created_at) of the newest message in a chat, or None if it is empty."""
+        self._sync(chat_id)
+        return self._read(
+            "SELECT id, created_at FROM messages WHERE chat_id = ? ORDER BY id DESC LIMIT 1",
+            (chat_id,)
+        ).fetchone()
+
+    def iter_history(self, chat_id: str, before: int | None = None, after: int | None = None,
+                     limit: int | None = None, chunk: int = 500):
+        """
+        Yield (id, role, message, created_at) oldest first, reading `chunk`
+        rows per query so a long chat is never held in memory at once.
+
+        `after` reads forward from past a message id and `before` stops short
+        of one. With a limit but no `after`, the newest `limit` messages below
+        `before` (or in the chat) are yielded instead: the page above the
+        oldest message the client has.
+        """
+        self._sync(chat_id)
+        upper = MAX_ROWID if before is None else before
+
+        if limit is not None and after is None:
+            # The newest `limit` rows below the cursor, then back in order
+            rows = self._read(
+                """
+                SELECT id, role, message, created_at FROM messages
+                 WHERE chat_id = ? AND id < ?
+                 ORDER BY id DESC LIMIT ?
+                """,
+                (chat_id, upper, limit)
+            ).fetchall()
+            yield from reversed(rows)
+            return
+
+        last = after or 0
+        remaining = limit
+        while remaining is None or remaining > 0:
+            size = chunk if remaining is None else min(chunk, remaining)
+            rows = self._read(
+                """
+                SELECT id, role, message, created_at FROM messages
+                 WHERE chat_id = ? AND id > ? AND id < ?
+                 ORDER BY id ASC LIMIT ?
+                """,
+                (chat_id, last, upper, size)
+            ).fetchall()
+            yield from rows
+            if len(rows) < size:
+                return
+            last = rows[-1][0]
+            if remaining is not None:
+                remaining -= len(rows)
+
+    def delete_chat(self, chat_id: str):
+        self._sync(chat_id)
+        with self.pool.transaction() as conn:
+            conn.execute("DELETE FROM messages WHERE chat_id = ?", (chat_id,))
+            conn.execute("DELETE FROM chats WHERE id = ?", (chat_id,))
+            conn.execute("DELETE FROM chat_summaries WHERE chat_id = ?", (chat_id,))
+            conn.execute("DELETE FROM message_traces WHERE chat_id = ?", (chat_id,))
+
+    # Chats
+    def message_count(self, chat_id: str) -> int:
+        self._sync(chat_id)
+        row = self._read("SELECT message_count FROM chats WHERE id = ?", (chat_id,)).fetchone()
+        return row[0] if row else 0
+
+    def list_chats(self, limit: int = 100, cursor: str | None = None):
+        """
+        Chats ordered by last activity, newest first.
+        Returns (rows, next_cursor); next_cursor is None on the last page.
+        """
+        if cursor:
+            rows = self._read(
+                """
+                SELECT id, title, created_at, updated_at, message_count FROM chats
+                 WHERE (updated_at, id) < (?, ?)
+                 ORDER BY updated_at DESC, id DESC LIMIT ?
+                """,
+                (*decode_cursor(cursor), limit + 1)
+            ).fetchall()
+        else:
+            rows = self._read(
+                """
+                SELECT id, title, created_at, updated_at, message_count FROM chats
+                 ORDER BY updated_at DESC, id DESC LIMIT ?
+                """,
+                (limit + 1,)
+            ).fetchall()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1]
+            next_cursor = encode_cursor(last[3], last[0])
+        return rows, next_cursor
+
+    # Summaries & traces
+    def load_summary(self, chat_id: str):
+        return self._read(
+            "SELECT summary, summarized_count FROM chat_summaries WHERE chat_id = ?",
+            (chat_id,)
+        ).fetchone()
+
+    def save_summary(self, chat_id: str, summary: str, summarized_count: int):
+        with self.pool.transaction() as conn:
+            conn.execute(
+                """
+                INSERT INTO chat_summaries (chat_id, summary, summarized_count, updated_at)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(chat_id) DO UPDATE SET
+                    summary = excluded.summary,
+                    summarized_count = excluded.summarized_count,
+                    updated_at = excluded.updated_at
+                """,
+                (chat_id, summary, summarized_count, utcnow())
+            )
+
+    def save_trace(self, chat_id: str, trace: dict):
+        with self.pool.transaction() as conn:
+            conn.execute(
+                "INSERT INTO message_traces (chat_id, path, tier, total_ms, trace, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (chat_id, trace["path"], trace["tier"], trace["total_ms"],
+                 json.dumps(trace["stages"]), utcnow())
+            )
+
+    # Full-text search
+    def search_messages(self, text: str, limit: int = 20, offset: int = 0):
+        """
+        Messages matching `text`, best match first (bm25). Snippets are
+        HTML: the message text is escaped and matches wrapped in <mark>.
+        Returns (rows, next_offset); next_offset is None on the last page.
+        Rows queued by the write-behind writer show up after its next flush.
+        """
+        match = fts_query(text)
+        if not match:
+            return [], None
+        rows = self._read(
+            """
+            SELECT m.chat_id, c.title, m.id, m.role,
+                   snippet(messages_fts, 0, ?, ?, '…', 16),
+                   m.created_at, bm25(messages_fts)
+              FROM messages_fts
+              JOIN messages m ON m.id = messages_fts.rowid
+              LEFT JOIN chats c ON c.id = m.chat_id
+             WHERE messages_fts MATCH ?
+             ORDER BY bm25(messages_fts)
+             LIMIT ? OFFSET ?
+            """,
+            (MARK_START, MARK_END, match, limit + 1, offset)
+        ).fetchall()
+        rows = [row[:4] + (highlight(row[4]),) + row[5:] for row in rows]
+
+        next_offset = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_offset = offset + limit
+        return rows, next_offset
+
+
+pool = ConnectionPool(DB_PATH)
+store = ChatStore(pool)
+atexit.register(store.close)
@@ -1,41 +1,50 @@
 # tasks.py
-from crewai import Task
-
-def create_tasks(query: str, agents: dict):
-    """
-    Create tasks that map to the MDAgents pipeline:
-
-    0. Complexity check     → Moderator (GP)
-    1. PCP round            → Primary care clinician
-    2. Radiology round      → Radiologist
-    3. Pathology round      → Pathologist
-    4. Surgical round       → Surgeon
-    5. Final integration    → Infectious disease / final decision specialist
-    """
-
-    complexity_check = Task(
-        description=f"""
+import hashlib
+import contextvars
+from collections import namedtuple
+from contextlib import contextmanager
+
+# Every LLM call of a case starts with case_context(query): the same
+# preamble and case text for all stages, so a provider with prompt
+# caching serves it from cache after the first call (see
+# agents.add_case_prefix). Templates hold only the role-specific
+# instructions that follow it and never contain the case themselves.
+TaskTemplate = namedtuple("TaskTemplate", "name agent description expected_output")
+
+CASE_PREAMBLE = """
+You are a member of an MDAgents-style multidisciplinary medical team:
+a moderator, a primary care clinician, a radiologist, a pathologist, a
+surgeon and an infectious disease specialist who leads the final review.
+Every member works on the same case, given below. The instructions for
+your own round follow the case; answer only what your round asks for.
+""".strip()
+
+
+def compile_template(name: str, agent: str, description: str, expected_output: str):
+    return TaskTemplate(name, agent, description.strip(), expected_output)
+
+
+TASK_TEMPLATES = (
+    compile_template(
+        "complexity_check",
+        "moderator",
+        """
 You must strictly answer with exactly one of these words:
 
 Low
 Moderate
 High
 
-Classify the medical query based on clinical complexity:
-
-{query}
-""".strip(),
-        agent=agents["moderator"],
-        expected_output="One word only: Low / Moderate / High",
-    )
-
-    low_case = Task(
-        description=f"""
+Classify the case above based on clinical complexity.
+""",
+        "One word only: Low / Moderate / High",
+    ),
+    compile_template(
+        "low_case",
+        "primary",
+        """
 PRIMARY CARE CLINICIAN ROUND (PCP SOLO):
 
-Case:
-{query}
-
 You are acting as a primary care clinician (PCP) for a LOW complexity case.
 
 FORMAT STRICTLY:
@@ -45,18 +54,15 @@ FORMAT STRICTLY:
 
 • Reasoning:
 (text explaining how you reached the diagnosis)
-""".strip(),
-        agent=agents["primary"],
-        expected_output="Diagnosis + Reasoning in the above structured format.",
-    )
-
-    radiology = Task(
-        description=f"""
+""",
+        "Diagnosis + Reasoning in the above structured format.",
+    ),
+    compile_template(
+        "radiology",
+        "radiologist",
+        """
 RADIOLOGY ROUND (MDT / ICT):
 
-Case:
-{query}
-
 You are a Radiologist in a multidisciplinary team.
 
 FORMAT STRICTLY:
@@ -66,18 +72,15 @@ FORMAT STRICTLY:
 
 • Reasoning:
 (text explaining your interpretation and impact on diagnosis/management)
-""".strip(),
-        agent=agents["radiologist"],
-        expected_output="Imaging Findings + Reasoning.",
-    )
-
-    pathology = Task(
-        description=f"""
+""",
+        "Imaging Findings + Reasoning.",
+    ),
+    compile_template(
+        "pathology",
+        "pathologist",
+        """
 PATHOLOGY ROUND (MDT / ICT):
 
-Case:
-{query}
-
 You are a Pathologist in a multidisciplinary team.
 
 FORMAT STRICTLY:
@@ -87,18 +90,15 @@ FORMAT STRICTLY:
 
 • Reasoning:
 (text explaining how pathology supports or changes the diagnosis)
-""".strip(),
-        agent=agents["pathologist"],
-        expected_output="Pathology Findings + Reasoning.",
-    )
-
-    surgery = Task(
-        description=f"""
+""",
+        "Pathology Findings + Reasoning.",
+    ),
+    compile_template(
+        "surgery",
+        "surgeon",
+        """
 SURGERY ROUND (ICT – Surgical Assessment):
 
-Case:
-{query}
-
 You are a Surgeon in the Integrated Care Team (ICT).
 
 FORMAT STRICTLY:
@@ -108,13 +108,13 @@ FORMAT STRICTLY:
 
 • Reasoning:
 (text explaining your decision-making)
-""".strip(),
-        agent=agents["surgeon"],
-        expected_output="Surgical Assessment + Reasoning.",
-    )
-
-    final_review = Task(
-        description=f"""
+""",
+        "Surgical Assessment + Reasoning.",
+    ),
+    compile_template(
+        "final_review",
+        "infectious",
+        """
 FINAL INTEGRATION ROUND (ICT LEAD / INFECTIOUS DISEASE):
 
 Combine ALL available team reports (PCP, Radiology, Pathology, Surgery if present)
@@ -130,16 +130,81 @@ FORMAT STRICTLY:
 
 • Justification:
 (text – how you integrated the multidisciplinary inputs and why this plan is appropriate)
-""".strip(),
-        agent=agents["infectious"],
-        expected_output="Final Diagnosis + Management Plan + Justification.",
+""",
+        "Final Diagnosis + Management Plan + Justification.",
+    ),
+)
+
+TEMPLATES_BY_NAME = {template.name: template for template in TASK_TEMPLATES}
+
+# Chained mode (crew_runner.PIPELINE_MODE) appends earlier findings under this
+DIGEST_HEADER = "Findings from earlier stages (summarised):"
+
+# Changes whenever any prompt text changes (used to version cached results)
+TEMPLATE_VERSION = hashlib.sha1(
+    repr((CASE_PREAMBLE, TASK_TEMPLATES, DIGEST_HEADER)).encode()
+).hexdigest()[:12]
+
+_case = contextvars.ContextVar("mdagents_case", default=None)
+
+
+def case_context(query: str) -> str:
+    """The shared prompt prefix of every stage of `query`."""
+    return f"{CASE_PREAMBLE}\n\nCase:\n{query}"
+
+
+@contextmanager
+def bound_case(query: str):
+    """Make `query` the case of the LLM calls made in this context."""
+    token = _case.set(case_context(query))
+    try:
+        yield
+    finally:
+        _case.reset(token)
+
+
+def current_case() -> str | None:
+    """case_context of the bound case, or None outside bound_case."""
+    return _case.get()
+
+
+def create_tasks(agents: dict):
+    """
+    Create tasks that map to the MDAgents pipeline:
+
+    0. Complexity check     → Moderator (GP)
+    1. PCP round            → Primary care clinician
+    2. Radiology round      → Radiologist
+    3. Pathology round      → Pathologist
+    4. Surgical round       → Surgeon
+    5. Final integration    → Infectious disease / final decision specialist
+
+    Templates are compiled once in TASK_TEMPLATES and carry no case text
+    (run them inside bound_case), so this is cheap to call per request.
+    """
+    from crewai import Task
+
+    return tuple(
+        Task(
+            name=template.name,
+            description=template.description,
+            agent=agents[template.agent],
+            expected_output=template.expected_output,
+        )
+        for template in TASK_TEMPLATES
     )
 
-    return (
-        complexity_check,  # index 0
-        low_case,          # index 1
-        radiology,         # index 2
-        pathology,         # index 3
-        surgery,           # index 4
-        final_review,      # index 5
+
+def chain_task(task, digest: str):
+    """Copy of `task` for chained mode, with `digest` appended as context."""
+    description = task.description
+    if digest:
+        description = f"{description}\n\n{DIGEST_HEADER}\n{digest}"
+    from crewai import Task
+
+    return Task(
+        name=task.name,
+        description=description,
+        agent=task.agent,
+        expected_output=task.expected_output,
     )
@@ -0,0 +1,62 @@
+# tests/test_executor.py
+import os
+import sys
+import asyncio
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import executor  # noqa: E402
+
+
+def blocked_pool():
+    """One worker held busy until the returned event is set."""
+    pool = executor.WorkerPool(max_workers=1, max_queue=1, retry_after=1)
+    release = threading.Event()
+    running = threading.Event()
+
+    def hold():
+        running.set()
+        release.wait(5)
+
+    busy = pool.submit(hold)
+    assert running.wait(5)
+    return pool, release, busy
+
+
+def test_cancelled_queued_job_frees_its_slot():
+    pool, release, busy = blocked_pool()
+    queued = pool.submit(lambda: None)
+    assert pool.stats()["queue_depth"] == 1
+
+    assert queued.cancel()
+    assert pool.stats()["queue_depth"] == 0
+    # The slot is usable again instead of answering QueueFull forever
+    pool.submit(lambda: None)
+
+    release.set()
+    busy.result(5)
+    pool.shutdown()
+    stats = pool.stats()
+    assert (stats["queue_depth"], stats["active_workers"]) == (0, 0)
+
+
+def test_cancelled_awaiting_task_frees_its_slot():
+    pool, release, busy = blocked_pool()
+
+    async def cancel_waiter():
+        task = asyncio.ensure_future(pool.run(lambda: None))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    asyncio.run(cancel_waiter())
+    assert pool.stats()["queue_depth"] == 0
+
+    release.set()
+    busy.result(5)
+    pool.shutdown()
+    assert pool.stats()["active_workers"] == 0
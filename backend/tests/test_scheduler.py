@@ -0,0 +1,66 @@
+# tests/test_scheduler.py
+import os
+import sys
+import asyncio
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import scheduler  # noqa: E402
+
+
+def test_worker_tickets_wait_for_a_free_worker():
+    async def main():
+        sched = scheduler.Scheduler(capacity=15, workers=2)
+        cases = [sched.enqueue("HIGH", f"c{i}", 2, worker=True) for i in range(3)]
+        chat = sched.enqueue("chat", "c9")
+        assert [t.granted for t in cases] == [True, True, False]
+        assert chat.granted  # capacity left over still serves chat
+        assert sched.stats()["workers_in_use"] == 2
+
+        cases[0].release()
+        assert cases[2].granted
+
+    asyncio.run(main())
+
+
+def test_release_weight_keeps_the_worker():
+    async def main():
+        sched = scheduler.Scheduler(capacity=4, workers=1)
+        case = sched.enqueue("HIGH", "a", 4, worker=True)
+        chat = sched.enqueue("chat", "b")
+        assert case.granted and not chat.granted
+
+        case.release_weight()
+        assert chat.granted
+        assert sched.stats()["workers_in_use"] == 1
+        case.release()
+        assert sched.stats()["in_flight"] == 1 and sched.stats()["workers_in_use"] == 0
+
+    asyncio.run(main())
+
+
+def test_hold_blocks_a_thread_until_granted():
+    async def main():
+        sched = scheduler.Scheduler(capacity=2)
+        busy = sched.enqueue("HIGH", "a", 2)
+        held = threading.Event()
+
+        def batch_case():
+            with sched.hold("LOW", "batch", 1):
+                held.set()
+
+        thread = threading.Thread(target=batch_case)
+        thread.start()
+        assert not held.wait(0.1)
+        busy.release()
+        await asyncio.to_thread(thread.join, 5)
+        assert held.is_set() and sched.stats()["in_flight"] == 0
+
+    asyncio.run(main())
+
+
+def test_reserve_sets_capacity_aside():
+    sched = scheduler.Scheduler(capacity=15)
+    sched.reserve(4)
+    assert sched.stats()["capacity"] == 11 and sched.stats()["reserved"] == 4
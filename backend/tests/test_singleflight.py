@@ -0,0 +1,65 @@
+# tests/test_singleflight.py
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import singleflight  # noqa: E402
+
+
+def test_join_waits_on_the_leader_without_running():
+    flights = singleflight.SingleFlight()
+    assert flights.join("k") is None
+
+    started = threading.Event()
+    release = threading.Event()
+
+    def work(emit):
+        emit("round", {"n": 1})
+        started.set()
+        release.wait(5)
+        return "answer"
+
+    leader = threading.Thread(target=flights.do, args=("k", work))
+    leader.start()
+    assert started.wait(5)
+
+    events = []
+    joined = flights.join("k", lambda kind, data: events.append(kind))
+    assert joined is not None and not joined.done()
+    assert events == ["round"]  # replayed to the late joiner
+
+    release.set()
+    leader.join(5)
+    assert joined.result(5) == "answer"
+    assert flights.in_flight() == 0
+
+
+def test_do_calls_on_join_for_joiners_only():
+    flights = singleflight.SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    joins = []
+
+    def work(emit):
+        started.set()
+        release.wait(5)
+        return 1
+
+    leader = threading.Thread(target=flights.do, args=("k", work, None, lambda: joins.append("leader")))
+    leader.start()
+    assert started.wait(5)
+
+    results = []
+    joiner = threading.Thread(
+        target=lambda: results.append(flights.do("k", work, None, lambda: joins.append("joiner")))
+    )
+    joiner.start()
+    while not joins:
+        time.sleep(0.01)
+    release.set()
+    leader.join(5)
+    joiner.join(5)
+    assert joins == ["joiner"] and results == [1]
@@ -0,0 +1,76 @@
+# tests/test_storage.py
+import os
+import sys
+import base64
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Importing storage opens the module-level store: keep it off the repo's database
+os.environ.setdefault("CHAT_DB_PATH", os.path.join(tempfile.mkdtemp(), "chat_history.db"))
+
+import storage  # noqa: E402
+
+
+def open_store(tmp_path, write_behind=False):
+    return storage.ChatStore(storage.ConnectionPool(str(tmp_path / "chat.db")), write_behind)
+
+
+def test_search_snippet_escapes_message_html(tmp_path):
+    store = open_store(tmp_path)
+    store.save_message("c1", "user", "fever and cough <b>x</b>")
+    rows, _ = store.search_messages("fever")
+    assert rows[0][4] == "<mark>fever</mark> and cough &lt;b&gt;x&lt;/b&gt;"
+    store.close()
+
+
+def test_cursor_round_trip():
+    cursor = storage.encode_cursor("2026-01-01T00:00:00Z", "c1")
+    assert storage.decode_cursor(cursor) == ("2026-01-01T00:00:00Z", "c1")
+
+
+@pytest.mark.parametrize("payload", [
+    b'[[1], {"a": 1}]', b'["a", 1]', b'["a"]', b'["a", "b", "c"]',
+    b'{"a": "b"}', b'12', b'not json',
+])
+def test_malformed_cursor_is_a_value_error(payload):
+    with pytest.raises(ValueError):
+        storage.decode_cursor(base64.urlsafe_b64encode(payload).decode())
+
+
+def test_list_chats_pages_with_cursor(tmp_path):
+    store = open_store(tmp_path)
+    for chat_id in ("a", "b", "c"):
+        store.save_message(chat_id, "user", f"hello {chat_id}")
+    first, cursor = store.list_chats(2)
+    rest, last = store.list_chats(2, cursor)
+    assert [r[0] for r in first + rest] == ["c", "b", "a"] and last is None
+    with pytest.raises(ValueError):
+        store.list_chats(2, base64.urlsafe_b64encode(b'[[1], {"a": 1}]').decode())
+    store.close()
+
+
+def test_write_behind_forgets_written_chats(tmp_path):
+    store = open_store(tmp_path, write_behind=True)
+    store.save_message("c1", "user", "hello")
+    assert [row[1] for row in store.get_history("c1")] == ["hello"]
+    assert not store.writer._pending
+    store.close()
+
+
+def test_write_behind_put_after_close_is_written(tmp_path):
+    store = open_store(tmp_path, write_behind=True)
+    store.writer.close()
+    store.save_message("c1", "user", "late")
+    assert store.message_count("c1") == 1
+    store.close()
+
+
+def test_write_behind_message_count_reads_own_writes(tmp_path):
+    store = open_store(tmp_path, write_behind=True)
+    store.writer.flush_ms = 60_000  # nothing reaches the database until a reader syncs
+    store.save_message("c1", "user", "one")
+    store.save_message("c1", "assistant", "two")
+    assert store.message_count("c1") == 2
+    store.close()
@@ -0,0 +1,217 @@
+# triage.py
+"""
+Local fast-path complexity triage.
+
+A small multinomial logistic regression over hashed word n-grams decides
+Low / Moderate / High on the CPU in well under a millisecond. When it is
+not confident enough the pipeline falls back to the LLM moderator, and
+every moderator decision is logged so the model can be retrained:
+
+    python triage.py train            # fit on logged decisions → TRIAGE_MODEL_PATH
+"""
+import os
+import sys
+import json
+import math
+import time
+import zlib
+import random
+import sqlite3
+import threading
+from result_cache import normalize
+
+# -----------------------------------
+# Settings
+# -----------------------------------
+TRIAGE_MODEL_PATH = os.getenv("TRIAGE_MODEL_PATH", "triage_model.json")
+TRIAGE_THRESHOLD = float(os.getenv("TRIAGE_THRESHOLD", "0.9"))
+TRIAGE_LOG_PATH = os.getenv("TRIAGE_LOG_PATH", os.getenv("CHAT_DB_PATH", "chat_history.db"))
+# The log holds case text: keep it bounded in age and size
+TRIAGE_LOG_TTL = int(os.getenv("TRIAGE_LOG_TTL", str(90 * 24 * 3600)))
+TRIAGE_LOG_MAX_ROWS = int(os.getenv("TRIAGE_LOG_MAX_ROWS", "50000"))
+N_FEATURES = 2 ** 18
+
+LABELS = ("LOW", "MODERATE", "HIGH")
+
+
+def features(text: str, n_features: int = N_FEATURES) -> list[int]:
+    """Hashed word unigrams and bigrams."""
+    words = normalize(text).split()
+    grams = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    return [zlib.crc32(g.encode()) % n_features for g in grams]
+
+
+# -----------------------------------
+# Model
+# -----------------------------------
+class HashedLinearModel:
+    """Softmax regression with sparse weights: feature index → [w per label]."""
+
+    def __init__(self, weights: dict | None = None, bias: list | None = None,
+                 n_features: int = N_FEATURES):
+        self.weights = weights or {}
+        self.bias = bias or [0.0] * len(LABELS)
+        self.n_features = n_features
+
+    def predict_proba(self, text: str) -> list[float]:
+        return self._proba_features(features(text, self.n_features))
+
+    def predict(self, text: str) -> tuple[str, float]:
+        probs = self.predict_proba(text)
+        best = max(range(len(LABELS)), key=probs.__getitem__)
+        return LABELS[best], probs[best]
+
+    @classmethod
+    def train(cls, samples, epochs: int = 15, lr: float = 0.2, l2: float = 1e-5,
+              seed: int = 0) -> "HashedLinearModel":
+        """samples: [(text, label)] with label in LABELS."""
+        model = cls()
+        data = [(features(text), LABELS.index(label)) for text, label in samples]
+        rng = random.Random(seed)
+        for _ in range(epochs):
+            rng.shuffle(data)
+            for feats, y in data:
+                probs = model._proba_features(feats)
+                grad = [p - (1.0 if k == y else 0.0) for k, p in enumerate(probs)]
+                for k in range(len(LABELS)):
+                    model.bias[k] -= lr * grad[k]
+                for f in feats:
+                    w = model.weights.setdefault(f, [0.0] * len(LABELS))
+                    for k in range(len(LABELS)):
+                        w[k] -= lr * (grad[k] + l2 * w[k])
+        return model
+
+    def _proba_features(self, feats) -> list[float]:
+        scores = list(self.bias)
+        for f in feats:
+            w = self.weights.get(f)
+            if w is not None:
+                for k in range(len(LABELS)):
+                    scores[k] += w[k]
+        top = max(scores)
+        exps = [math.exp(s - top) for s in scores]
+        total = sum(exps)
+        return [e / total for e in exps]
+
+    def save(self, path: str):
+        with open(path, "w") as f:
+            json.dump({
+                "labels": LABELS,
+                "n_features": self.n_features,
+                "bias": self.bias,
+                "weights": {str(k): v for k, v in self.weights.items()},
+            }, f)
+
+    @classmethod
+    def load(cls, path: str) -> "HashedLinearModel":
+        with open(path) as f:
+            data = json.load(f)
+        weights = {int(k): v for k, v in data["weights"].items()}
+        return cls(weights, data["bias"], data["n_features"])
+
+
+# -----------------------------------
+# Moderator decision log (training data)
+# -----------------------------------
+class TriageLog:
+    """
+    Moderator decisions with their case text. Rows older than `ttl`
+    seconds are dropped, and only the newest `max_rows` are kept.
+    """
+
+    def __init__(self, path: str, ttl: int = TRIAGE_LOG_TTL,
+                 max_rows: int = TRIAGE_LOG_MAX_ROWS):
+        self.ttl = ttl
+        self.max_rows = max_rows
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS triage_log (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                query TEXT NOT NULL,
+                label TEXT NOT NULL,
+                llm_ms REAL,
+                created_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_triage_log_created ON triage_log (created_at);
+        """)
+
+    def record(self, query: str, label: str, llm_ms: float | None):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO triage_log (query, label, llm_ms, created_at) VALUES (?, ?, ?, ?)",
+                (query, label, llm_ms, now)
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now: float):
+        self._conn.execute("DELETE FROM triage_log WHERE created_at < ?", (now - self.ttl,))
+        self._conn.execute(
+            "DELETE FROM triage_log WHERE id <= (SELECT MAX(id) FROM triage_log) - ?",
+            (self.max_rows,)
+        )
+
+    def samples(self) -> list[tuple[str, str, float | None]]:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT query, label, llm_ms FROM triage_log WHERE label IN (?, ?, ?) ORDER BY id",
+                LABELS
+            ).fetchall()
+
+
+# -----------------------------------
+# Pipeline stage
+# -----------------------------------
+class LocalTriage:
+    """
+    Triage stage for MDAgentsPipeline.
+
+    decide(query) returns a level when the local model is confident,
+    otherwise None (→ ask the LLM moderator). record() stores the
+    moderator's answer for the next training run.
+    """
+
+    def __init__(self, model: HashedLinearModel | None, threshold: float,
+                 log: TriageLog | None = None):
+        self.model = model
+        self.threshold = threshold
+        self.log = log
+
+    def decide(self, query: str) -> str | None:
+        if self.model is None:
+            return None
+        label, confidence = self.model.predict(query)
+        return label if confidence >= self.threshold else None
+
+    def record(self, query: str, label: str, llm_ms: float | None = None):
+        if self.log is not None:
+            self.log.record(query, label, llm_ms)
+
+
+def load_default() -> LocalTriage:
+    model = None
+    if os.path.exists(TRIAGE_MODEL_PATH):
+        model = HashedLinearModel.load(TRIAGE_MODEL_PATH)
+    return LocalTriage(model, TRIAGE_THRESHOLD, TriageLog(TRIAGE_LOG_PATH))
+
+
+def main(argv):
+    if argv[1:2] != ["train"]:
+        print(__doc__)
+        return 1
+
+    samples = TriageLog(TRIAGE_LOG_PATH).samples()
+    if not samples:
+        print("No logged moderator decisions to train on.")
+        return 1
+
+    model = HashedLinearModel.train([(q, label) for q, label, _ in samples])
+    model.save(TRIAGE_MODEL_PATH)
+    print(f"Trained on {len(samples)} decisions → {TRIAGE_MODEL_PATH}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))